@@ -4,20 +4,26 @@
 #======================= DESCRIPTION =========================#
 # Mazer is a cool maze solving game that runs on Python 3.7!
 # Features:
-# - Loading mazes from csv file (from parent file directory)
-# - Viewing mazes
+# - Loading mazes from csv file or packed .mzb file (from parent file directory)
+# - Viewing mazes (any size, scrolled to fit the terminal)
 # - Playing mazes (scored by time)
-# - Configuring mazes with inbuilt maze editor
-# - Exporting current loaded maze to new csv file
-# - Generating blank mazes for editing
+# - Configuring mazes with inbuilt maze editor (fills, lines, paste, undo/redo)
+# - Exporting current loaded maze to new csv file (or packed .mzb file)
+# - Generating blank or random mazes (from any seed) for editing
 # - Raspberry Pi SenseHat integration
 # - Leaderboards! (Unique for every maze --> Console vs Pi!)
+# - Shortest path solver (BFS / A* / bidirectional BFS / junction graph)
+# - Hints, par moves and wrong way warnings while playing
+# - Game server for playing over the network, many players at once
 # Prerequisites:
 # 1. Python 3.7
 # 2. Raspberry Pi with SenseHat + Raspbian (and also py3.7)
 # How to start:
 # 1. Navigate to the directory you downloaded this game in
 # 2. Run -> python3 mazer.py
+# Batch tools (validate/solve/digest/convert/generate/render/edit/analyze/audit/bench/bots)
+# and the game server (serve/connect/loadtest):
+# - Run -> python3 mazer.py --help
 #=============================================================#
 
 #======================= HIGHLIGHTING ========================#
@@ -29,23 +35,53 @@ globalPrintMode = 0 # Defaults to no highlighting
 # 2: Color highlighting for IDLE (Windows/Mac)
 #=============================================================#
 
+#======================= STORAGE =============================#
+globalStorageMode = 0 # Defaults to leaderboard text files
+# Set the variable above according to how leaderboards should
+# be stored:
+# 0: Text files (leaderboard.txt, pi_leaderboard.txt)
+# 1: SQLite databases (leaderboard.db, pi_leaderboard.db),
+#    safe for many games running at once. Existing text
+#    files are imported the first time a database is made.
+#=============================================================#
+
 #======================= CLASS INFO ==========================#
-# Maze contains 3 variables:
-# 1.    self.maze -----> 2D list containing maze data as
-#       [[str, str, str...]]
+# Grid contains 3 variables:
+# 1.    self.rows -----> int containing the number of rows
+# 2.    self.cols -----> int containing the number of columns
+# 3.    self.cells ----> bytearray containing one cell code per
+#       cell, row by row (see CELL CODES below)
+#
+# Maze contains 5 variables:
+# 1.    self.maze -----> Grid containing maze data
 # 2.    self.start ----> 1D list containing start coordinates
 #       as [row, column] as [int, int]
 # 3.    self.end ------> 1D list containing end coordinates as
 #       [row, column] as [int, int]
+# 4.    self.digests --> dict caching digests of the maze data
+#       as {kind: str}, emptied whenever the maze changes
+# 5.    self.junctions > JunctionGraph of the maze, cached until
+#       the maze changes (None until needed)
 #
-# Leaderboard contains 1 variable:
-# 1.    self.boards ---> 1D list containing only Board objects
-#       as [Board, Board, Board...]
+# Leaderboard contains 6 variables:
+# 1.    self.boards ---> dict containing Board objects by id
+#       as {str: Board, str: Board...}
+# 2.    self.l_filename > string containing the leaderboard file
+# 3.    self.j_filename > string containing the journal file
+# 4.    self.lock -----> Lock held while boards are changed
+# 5.    self.journalled > int containing wins in the journal
+# 6.    self.generation > int counting rewrites of the file
 #
-# Board contains 2 variables:
+# SQLiteLeaderboard contains 2 variables:
+# 1.    self.db_filename > string containing the database file
+# 2.    self.db -------> sqlite3 connection to the database
+#
+# Board contains 3 variables:
 # 1.    self.digest_id > string containing the id of the board
-# 2.    self.players --> 1D list of Player objects as
-#       [Player, Player, Player...]
+# 2.    self.players --> 1D list of Player objects sorted by
+#       score as [Player, Player, Player...]
+# 3.    self.scores ---> 1D list of the players' scores as
+#       [float, float, float...]
 #
 # Player contains 2 variables:
 # 1.    self.playerID -> string containing id of player
@@ -55,75 +91,539 @@ globalPrintMode = 0 # Defaults to no highlighting
 # CODE STARTS HERE #
 
 # NOTE: IMPORTS
-import time, hashlib, copy, sys
+import time, hashlib, sys, heapq, random, shutil, zlib, os, bisect, threading, atexit, sqlite3, struct, mmap
+import argparse, glob, json, re, queue, collections, timeit, tempfile, platform, contextlib
+# Modules only needed by the worker processes (concurrent.futures), the game server and client (asyncio, socket)
+# and the startup benchmark (subprocess) are imported where they are used, so starting the game doesn't wait on them
+from array import array
+
+# NOTE: LIMITS
+MAX_DIMENSION = 10000 # Max rows/columns for mazes created from the menu
+
+# NOTE: MAZE FILE FORMATS
+MAZE_FORMATS = ["csv", "csv.gz", "csv.xz", "mzb"] # Maze file extensions: text, text compressed with gzip or lzma, and packed (below)
+GZIP_LEVEL, XZ_PRESET = 6, 1 # Compression used for .csv.gz and .csv.xz files, trading a little size for a lot of speed
+
+# NOTE: MZB FILE FORMAT
+# A .mzb file is a 48 byte header followed by one bit per cell (1 for walls), row by row, 8 cells per
+# byte with the first cell in the highest bit. The start and end are only stored in the header.
+MZB_HEADER = struct.Struct("<4sBBxxIIIIII16s") # magic, version, flags, rows, cols, start, end, MD5 digest
+MZB_MAGIC, MZB_VERSION = b"MZB\x00", 1
+MZB_VERIFIED = 1 # Flag set when the end is known to be reachable from the start
+NO_CELL = 0xFFFFFFFF # Start/end coords stored when a maze has no start/end
+
+# NOTE: TILED STORAGE SETTINGS
+TILE_SIZE = 256 # Width and height in cells of the tiles that huge mazes are read in
+TILE_CACHE = 64 # Tiles kept in memory at once (4MB with 256 x 256 tiles), whatever the size of the maze
+TILED_CELLS = 1 << 26 # .mzb mazes with more cells than this are read a tile at a time instead of memory mapped
+
+# NOTE: DISPLAY SETTINGS
+VIEW_STATUS_LINES = 8 # Terminal lines kept free under a maze for status text and prompts
+VIEW_FALLBACK = 100 # Rows and columns of maze shown when the size of the terminal can't be found
+
+# NOTE: SENSEHAT SETTINGS
+PI_DIRECTIONS = {"up":"W", "down":"S", "left":"A", "right":"D", "middle":"M"} # Joystick direction to key
+PI_SIZE = 8 # Width and height of the LED matrix
+PI_MARGIN = 2 # Cells kept between the player and the edge of the LED matrix while the view can still scroll
+PI_COLORS = {"X":[127,127,127], "O":[0,0,0], "A":[127,0,0], "B":[0,127,0]} # LED color of each cell character
+PI_OUTSIDE = [127,127,127] # LED color past the edges of the maze
+
+# NOTE: LEADERBOARD SETTINGS
+BOARD_SIZE = 10 # Players kept on each maze's leaderboard
+JOURNAL_LIMIT = 1000 # Journalled wins before the leaderboard file is rewritten in the background
+MIN_MOVE_SECONDS = 0.02 # Least time between two moves of a ranked run (50 a second, faster than anyone plays)
+
+# NOTE: EDITOR SETTINGS
+FIELD_REPAIR_LIMIT = 64 # Cells changed by one edit above which the editor's DistanceField is rebuilt instead of repaired
+SCRIPT_OPERATIONS = {"set": "ROW COL CELL", "fill": "ROW COL ROW COL CELL", "line": "ROW COL ROW COL CELL",
+                     "flood": "ROW COL CELL", "paste": "FILE ROW COL", "undo": "", "redo": ""} # Edit script operations and their arguments
+
+# NOTE: BENCHMARK SETTINGS
+BENCH_SIZES = [8, 64, 512, 4096] # Width and height of the synthetic mazes benchmarked
+BENCH_BOARDS = [10, 1000, 100000] # Number of boards on the synthetic leaderboards benchmarked
+BENCH_THRESHOLD = 0.10 # Slowdown against a baseline (as a fraction) that counts as a regression
+
+# NOTE: BOT SETTINGS
+BOT_BATCH = 256 # Moves a bot plans before sending them to Maze.applyMoves in one call
+
+# NOTE: SERVER SETTINGS
+SERVER_HOST, SERVER_PORT = "127.0.0.1", 7878 # Where the game server listens by default (only this machine)
+SERVER_BACKLOG = 1024 # Connections the game server lets wait to be accepted, so thousands can join at once
+SERVER_FLUSH_SECONDS = 1.0 # Seconds between writes of the game server's batched wins to the leaderboard
+SERVER_VIEW_LIMIT = 200 # Most rows and columns sent for one view of a maze
+
+# NOTE: CACHE SETTINGS
+CACHE_DIR = ".mazer_cache" # Where parsed mazes are cached (MAZER_CACHE sets another directory, or 0 to turn it off)
+CACHE_LIMIT = 1 << 28 # Bytes the cache holds before the least recently used mazes are removed
+CACHE_MIN_BYTES = 1 << 16 # Maze files smaller than this are read quickly enough that they aren't cached
+
+# NOTE: PROFILING SETTINGS
+PROFILE_BUCKETS = [0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5] # Upper bounds (seconds) of the timing histogram buckets
+
+# NOTE: CELL CODES
+# Every cell of a maze is stored as a single byte holding one of the codes below.
+# The "+" code is only ever drawn as the editor cursor, and never stored in a maze.
+PASSAGE, WALL, START, END, CURSOR = 0, 1, 2, 3, 4
+INVALID = 255 # Code for characters that can't appear in a maze
+CELL_CHARS = "OXAB+" # Cell character for each code, indexed by code
+CELL_CODES = {char: code for code, char in enumerate(CELL_CHARS)}
+
+# Translation tables between maze text (as bytes) and cell codes, for use with bytes.translate
+TEXT_TO_CELLS = bytes(CELL_CODES.get(chr(i), INVALID) for i in range(256))
+CELLS_TO_TEXT = bytes(ord(CELL_CHARS[i]) if i < len(CELL_CHARS) else ord("?") for i in range(256))
+CELLS_TO_BITS = bytes(1 if i == WALL else 0 for i in range(256)) # 1 for walls, 0 for everything else
+CELLS_TO_OPEN = bytes(1 if i in (PASSAGE, START, END) else 0 for i in range(256)) # 1 for cells that can be walked on
+OPEN_NEIGHBOURS = bytes(bin(i).count("1") if i != 255 else 255 for i in range(256)) # Open neighbours of each openDirections value
+NODE_CELLS = bytes(1 if i != 255 and bin(i).count("1") != 2 else 0 for i in range(256)) # 1 for openDirections values that aren't corridors
+LOWEST_DIRECTION = bytes(max(0, (i & -i).bit_length() - 1) for i in range(256)) # Direction of the lowest bit of openDirections values
+
+# Visual and color enhancements for each cell character when printing
+FRAME_TOP = 2 # Lines printed above the first row of a maze (separator + blank line)
+VISUAL_CHARS = {"X":"#", "O":".", "A":"a", "B":"b", "+":"+"}
+TERMINAL_COLORS = {"X":"\033[37m", "O":"\033[90m", "A":"\033[31m", "B":"\033[32m", "+":"\033[93m"}
+IDLE_COLORS = {"X":"OUTPUT", "O":"OUTPUT", "A":"STRING", "B":"COMMENT", "+":"KEYWORD"}
 
 # NOTE: CLASSES
 
-########### NOTE: MAZE CLASS DEFINITION START ###########
+########### NOTE: GRID CLASS DEFINITION START ###########
 
-class Maze:
+class Grid:
 
     # NOTE: class init declaration
-    def __init__(self, mazeArray, mazeStart, mazeEnd):
-        '''Create a maze object with a 2D list with maze data, a 1D list containing the start coords,
-        and a 1D list containing the end coords'''
-        self.maze, self.start, self.end = mazeArray, mazeStart, mazeEnd
+    def __init__(self, rows, cols, cells=None):
+        '''Create a grid of <rows> by <cols> cells, stored row by row in a bytearray with one cell code
+        per cell. The grid is filled with passages unless a bytearray is passed into <cells>.'''
+        self.rows, self.cols = rows, cols
+        self.cells = bytearray(rows * cols) if cells is None else cells
+
+    @classmethod
+    def fromRows(cls, rowData):
+        '''Creates a Grid from a list of rows, where each row is a string or a list of cell characters.
+        Characters that aren't cell characters are stored as INVALID.'''
+        cells = bytearray()
+        for row in rowData:
+            cells += "".join(row).encode("ascii", "replace").translate(TEXT_TO_CELLS)
+        return cls(len(rowData), len(rowData[0]) if rowData else 0, cells)
 
 ########### NOTE: CLASS METHODS ###########
 
-    def printMaze(self):
-        '''Prints the maze in self.maze to the console.'''
-        printSeparator(36)
+    def __len__(self):
+        '''Returns the number of rows in the grid.'''
+        return self.rows
 
-        # Visual Enhancements Dictionary
-        v_dict = {"X":"#", "O":".", "A":"a", "B":"b", "+":"+"}
+    def close(self):
+        '''Releases the file the grid's cells are read from. Grids kept in memory have none.'''
 
-        # Color Enhancements Dictionary
-        if globalPrintMode == 1:
-            c_dict = {"X":"\033[37m", "O":"\033[90m", "A":"\033[31m", "B":"\033[32m", "+":"\033[93m"}
-        elif globalPrintMode == 2:
-            c_dict = {"X":"OUTPUT", "O":"OUTPUT", "A":"STRING", "B":"COMMENT", "+":"KEYWORD"}
+    def get(self, r, c):
+        '''Returns the cell code at row <r>, column <c>.'''
+        return self.cells[r * self.cols + c]
 
-        for l in range(len(self.maze)):
-            for c in range(len(self.maze[l])):
+    def set(self, r, c, code):
+        '''Sets the cell at row <r>, column <c> to the cell code <code>.'''
+        self.cells[r * self.cols + c] = code
 
-                # Print char + space for better visual representation, one at a time for all characters in a row
-                if globalPrintMode == 1:
-                    print(c_dict[self.maze[l][c]] + v_dict[self.maze[l][c]] + "\033[0m", end=" ")
-                elif globalPrintMode == 2:
-                    color.write(v_dict[self.maze[l][c]] + " ", c_dict[self.maze][l][c])
-                else:
-                    print(v_dict[self.maze[l][c]], end=" ")
+    def inBounds(self, r, c):
+        '''Checks if row <r>, column <c> is a cell within the grid.'''
+        return 0 <= r < self.rows and 0 <= c < self.cols
 
-            # Print newline for each new row
-            print()
+    def row(self, r):
+        '''Returns the cell codes of row <r> as bytes.'''
+        return bytes(self.cells[r * self.cols:(r + 1) * self.cols])
 
-    def movePiece(self, piece_repr, bgMazeObj, user_input, invalid_spaces):
-        '''Moves a piece (at the coords of self.start) depending on user input, and checks
-        if the move is valid, else informing the user that the move is invalid. Requires a background
-        Maze object to reference for the character that the piece is standing on.'''
+    def rowSlice(self, r, first, last):
+        '''Returns the cell codes of row <r> from column <first> up to (not including) column <last> as bytes.'''
+        return bytes(self.cells[r * self.cols + first:r * self.cols + last])
 
-        # Check that user input is within the move dictionary
-        if user_input.upper() in ["W", "A", "S", "D"]:
-            # Map movements from user input to array of x/y value changes
-            moveMap = {'W':[-1,0], "A":[0,-1], "S":[1,0], "D":[0,1]}[user_input.upper()]
-            upperLimit = [len(self.maze)-1, len(self.maze[0])-1]
-        
+    def copy(self):
+        '''Makes a new Grid object with the same cells as the caller and returns it.'''
+        return Grid(self.rows, self.cols, bytearray(self.cells))
+
+    def md5Digest(self):
+        '''Returns the MD5 hash of the grid's text (see toText) in hexadecimal format. The cells are
+        hashed a block of rows at a time, so the whole text is never built.'''
+        md5, cols = hashlib.md5(), self.cols
+        blockRows = max(1, (1 << 20) // max(cols, 1)) # About 1MB of cells per block
+        for first in range(0, self.rows, blockRows):
+            block = memoryview(self.cells[first*cols:(first+blockRows)*cols].translate(CELLS_TO_TEXT))
+            for i in range(0, len(block), cols):
+                if first or i:
+                    md5.update(b"\n")
+                md5.update(block[i:i+cols])
+        return md5.hexdigest()
+
+    def fastDigest(self):
+        '''Returns a quick (non-cryptographic) hash of the grid's dimensions and raw cells.'''
+        return f"{self.rows}x{self.cols}-{zlib.crc32(self.cells):08x}{zlib.adler32(self.cells):08x}"
+
+    def toText(self):
+        '''Returns the grid as text, with one line of cell characters per row.'''
+        text = self.cells.translate(CELLS_TO_TEXT).decode("ascii")
+        return "\n".join(text[r * self.cols:(r + 1) * self.cols] for r in range(self.rows))
+
+########### NOTE: GRID CLASS DEFINITION END ###########
+
+########### NOTE: PACKED GRID CLASS DEFINITION START ###########
+
+class PackedCells:
+
+    # NOTE: class init declaration
+    def __init__(self, data, offset, size, start_index, end_index):
+        '''Create a read-only view of <size> cell codes, packed one bit per cell into <data> (bytes or an
+        mmap) from byte <offset> onwards, with the start and end at the flat indices given (-1 if none).
+        Cells are unpacked only when they are read, so the data never has to be read in all at once.'''
+        self.data, self.offset, self.size = data, offset, size
+        self.startIndex, self.endIndex = start_index, end_index
+
+########### NOTE: CLASS METHODS ###########
+
+    def __len__(self):
+        return self.size
+
+    def close(self):
+        '''Unmaps the .mzb file the cells are read from. No cells can be read afterwards.'''
+        if isinstance(self.data, mmap.mmap): # Cells over plain bytes have nothing to release
+            self.data.close()
+
+    def __getitem__(self, i):
+        '''Returns the cell code at flat index <i> (wall bits are already the WALL/PASSAGE codes).'''
+        if i == self.startIndex:
+            return START
+        if i == self.endIndex:
+            return END
+        return (self.data[self.offset + (i >> 3)] >> (7 - (i & 7))) & 1
+
+    def count(self, code):
+        '''Returns the number of START or END cells, which are known from the header.'''
+        return int(self.find(code) != -1)
+
+    def find(self, code):
+        '''Returns the flat index of the START or END cell, or -1 if there isn't one.'''
+        if code not in (START, END):
+            raise ValueError("Only the start and end of a packed maze can be searched for")
+        return self.startIndex if code == START else self.endIndex
+
+    rfind = find # There is never more than 1 start or end
+
+    def unpack(self, first, last):
+        '''Returns the cell codes from flat index <first> up to (not including) <last> as a bytearray.'''
+        lo = first >> 3
+        cells = unpackBits(self.data[self.offset + lo:self.offset + ((last + 7) >> 3)])[first - 8*lo:last - 8*lo]
+        for i, code in [(self.startIndex, START), (self.endIndex, END)]:
+            if first <= i < last:
+                cells[i - first] = code
+        return cells
+
+class PackedGrid(Grid):
+
+    # NOTE: class init declaration
+    def __init__(self, rows, cols, cells, digest):
+        '''Create a read-only Grid of <rows> by <cols> from a PackedCells object, with <digest> being the
+        MD5 digest of its text (as stored in a .mzb header) in hexadecimal format.'''
+        Grid.__init__(self, rows, cols, cells)
+        self.digest = digest
+
+########### NOTE: CLASS METHODS ###########
+
+    def set(self, r, c, code):
+        '''Packed grids can't be changed, make a copy with copy() to edit them.'''
+        raise TypeError("Packed mazes are read only, copy them to edit them")
+
+    def close(self):
+        '''Closes the .mzb file behind the grid (see PackedCells.close).'''
+        self.cells.close()
+
+    def row(self, r):
+        '''Returns the cell codes of row <r> as bytes.'''
+        return bytes(self.cells.unpack(r * self.cols, (r + 1) * self.cols))
+
+    def rowSlice(self, r, first, last):
+        '''Returns the cell codes of row <r> from column <first> up to (not including) column <last> as bytes.'''
+        return bytes(self.cells.unpack(r * self.cols + first, r * self.cols + last))
+
+    def copy(self):
+        '''Unpacks the whole grid into a new (editable) Grid object and returns it.'''
+        return Grid(self.rows, self.cols, self.cells.unpack(0, len(self.cells)))
+
+    def md5Digest(self):
+        '''Returns the MD5 digest stored with the grid, without reading any cells.'''
+        return self.digest
+
+    def fastDigest(self):
+        '''Returns the same hash as Grid.fastDigest, unpacking about 8 million cells at a time.'''
+        crc, adler, size = 0, 1, len(self.cells)
+        for first in range(0, size, 1 << 23):
+            block = self.cells.unpack(first, min(first + (1 << 23), size))
+            crc, adler = zlib.crc32(block, crc), zlib.adler32(block, adler)
+        return f"{self.rows}x{self.cols}-{crc:08x}{adler:08x}"
+
+    def toText(self):
+        '''Returns the grid as text, with one line of cell characters per row.'''
+        return "\n".join(self.row(r).translate(CELLS_TO_TEXT).decode("ascii") for r in range(self.rows))
+
+class TiledCells(PackedCells):
+
+    # NOTE: class init declaration
+    def __init__(self, f, offset, rows, cols, start_index, end_index):
+        '''Create a read-only view of the <rows> by <cols> cells packed one bit per cell into the open file <f>
+        from byte <offset> onwards (as in a .mzb file). The cells are split into tiles of TILE_SIZE by
+        TILE_SIZE, read from the file only when one of their cells is needed and kept in a cache of the
+        TILE_CACHE tiles used last, so memory use doesn't grow with the size of the maze.'''
+        PackedCells.__init__(self, None, offset, rows * cols, start_index, end_index)
+        self.f, self.rows, self.cols = f, rows, cols
+        self.tiles = collections.OrderedDict() # (tile row, tile column) -> bytearray of cells, least recently used first
+
+########### NOTE: CLASS METHODS ###########
+
+    def tile(self, tr, tc):
+        '''Returns the cells of the tile at tile row <tr>, tile column <tc> as a bytearray, row by row,
+        reading it from the file if it isn't cached.'''
+        cells = self.tiles.get((tr, tc))
+        if cells is not None:
+            self.tiles.move_to_end((tr, tc))
+            return cells
+
+        cells, width = bytearray(), min(TILE_SIZE, self.cols - tc*TILE_SIZE)
+        for r in range(tr*TILE_SIZE, min((tr + 1)*TILE_SIZE, self.rows)):
+            first = r*self.cols + tc*TILE_SIZE
+            lo, hi = first >> 3, (first + width + 7) >> 3
+            self.f.seek(self.offset + lo)
+            cells += unpackBits(self.f.read(hi - lo))[first - 8*lo:first - 8*lo + width]
+            for i, code in [(self.startIndex, START), (self.endIndex, END)]:
+                if first <= i < first + width:
+                    cells[len(cells) - width + i - first] = code
+        profiler.count("tiles read")
+
+        self.tiles[(tr, tc)] = cells
+        if len(self.tiles) > TILE_CACHE:
+            self.tiles.popitem(last=False)
+        return cells
+
+    def __getitem__(self, i):
+        '''Returns the cell code at flat index <i>.'''
+        r, c = divmod(i, self.cols)
+        return self.tile(r // TILE_SIZE, c // TILE_SIZE)[(r % TILE_SIZE) * min(TILE_SIZE, self.cols - c // TILE_SIZE * TILE_SIZE) + c % TILE_SIZE]
+
+    def unpack(self, first, last):
+        '''Returns the cell codes from flat index <first> up to (not including) <last> as a bytearray,
+        copied out of the tiles they are in a row at a time. A whole row or more is read straight from the
+        file instead (see read), as streaming row after row through the tiles would push each tile out of
+        the cache before its next row was needed.'''
+        if last - first >= self.cols:
+            return self.read(first, last)
+        cells = bytearray()
+        while first < last:
+            r, c = divmod(first, self.cols)
+            stop = min(self.cols, c + last - first)
+            for tc in range(c // TILE_SIZE, (stop - 1) // TILE_SIZE + 1):
+                tile, left = self.tile(r // TILE_SIZE, tc), tc * TILE_SIZE
+                width, base = min(TILE_SIZE, self.cols - left), (r % TILE_SIZE) * min(TILE_SIZE, self.cols - left)
+                cells += tile[base + max(c, left) - left:base + min(stop, left + width) - left]
+            first += stop - c
+        return cells
+
+    def close(self):
+        '''Closes the .mzb file the tiles are read from. No cells can be read afterwards.'''
+        self.f.close()
+        self.tiles.clear()
+
+    def read(self, first, last):
+        '''Returns the cell codes from flat index <first> up to (not including) <last> as a bytearray, read
+        from the file in one go without going through the tile cache.'''
+        lo, hi = first >> 3, (last + 7) >> 3
+        self.f.seek(self.offset + lo)
+        cells = unpackBits(self.f.read(hi - lo))[first - 8*lo:last - 8*lo]
+        for i, code in [(self.startIndex, START), (self.endIndex, END)]:
+            if first <= i < last:
+                cells[i - first] = code
+        profiler.count("bytes read", hi - lo)
+        return cells
+
+class TiledGrid(PackedGrid):
+
+    # NOTE: class init declaration
+    def __init__(self, rows, cols, cells, digest):
+        '''Create a read-only Grid of <rows> by <cols> from a TiledCells object, for mazes too big to keep
+        in memory, with <digest> being the MD5 digest of its text (as stored in a .mzb header) in hexadecimal format.'''
+        PackedGrid.__init__(self, rows, cols, cells, digest)
+
+########### NOTE: CLASS METHODS ###########
+
+    def get(self, r, c):
+        '''Returns the cell code at row <r>, column <c>, reading only the tile it is in.'''
+        tile = self.cells.tile(r // TILE_SIZE, c // TILE_SIZE)
+        return tile[(r % TILE_SIZE) * min(TILE_SIZE, self.cols - c // TILE_SIZE * TILE_SIZE) + c % TILE_SIZE]
+
+class MZBWriter:
+
+    # NOTE: class init declaration
+    def __init__(self, file_name, rows, cols):
+        '''Create a writer that streams a maze of <rows> by <cols> into the .mzb file <file_name>, one
+        row at a time. Only about 8 million cells are held in memory, whatever the size of the maze.'''
+        self.f = open(file_name, 'wb')
+        self.f.write(bytes(MZB_HEADER.size)) # Filled in once the start, end and digest are known
+        self.rows, self.cols, self.written = rows, cols, 0
+        self.md5, self.bits = hashlib.md5(), bytearray()
+        self.start, self.end = [NO_CELL, NO_CELL], [NO_CELL, NO_CELL]
+
+########### NOTE: CLASS METHODS ###########
+
+    def writeRow(self, row):
+        '''Writes the next row of the maze, given as bytes of cell codes.'''
+        if self.written:
+            self.md5.update(b"\n")
+        self.md5.update(row.translate(CELLS_TO_TEXT))
+        if START in row:
+            self.start = [self.written, row.find(START)]
+        if END in row:
+            self.end = [self.written, row.find(END)]
+        self.bits += row.translate(CELLS_TO_BITS)
+        self.written += 1
+
+        if len(self.bits) >= 1 << 23:
+            whole = len(self.bits) & ~7
+            self.f.write(packBits(self.bits[:whole]))
+            del self.bits[:whole]
+
+    def close(self, verified=False):
+        '''Writes the last cells and the header, then closes the file. <verified> is saved in the header
+        to say whether the end is known to be reachable from the start.'''
+        self.bits += bytes(-len(self.bits) % 8) # Pad the last byte
+        self.f.write(packBits(self.bits))
+        self.f.seek(0)
+        self.f.write(MZB_HEADER.pack(MZB_MAGIC, MZB_VERSION, MZB_VERIFIED if verified else 0, self.rows, self.cols,
+                                     self.start[0], self.start[1], self.end[0], self.end[1], self.md5.digest()))
+        self.f.close()
+
+########### NOTE: PACKED GRID CLASS DEFINITION END ###########
+
+########### NOTE: MAZE CLASS DEFINITION START ###########
+
+class Maze:
+
+    # NOTE: class init declaration
+    def __init__(self, mazeArray, mazeStart, mazeEnd):
+        '''Create a maze object with a Grid (or a 2D list of cell characters) containing maze data,
+        a 1D list containing the start coords, and a 1D list containing the end coords'''
+        self.maze = mazeArray if isinstance(mazeArray, Grid) else Grid.fromRows(mazeArray)
+        self.start, self.end = mazeStart, mazeEnd
+        self.digests = {} # Cached digests of self.maze by kind, emptied whenever the maze changes
+        self.junctions = None # Cached JunctionGraph of self.maze, dropped whenever the maze changes
+
+########### NOTE: CLASS METHODS ###########
+
+    def setMaze(self, grid, start, end):
+        '''Replaces the maze data stored by the caller with the Grid <grid> and the start and end coords.'''
+        self.maze, self.start, self.end = grid, start, end
+        self.markChanged()
+
+    def markChanged(self):
+        '''Marks the maze data as changed, so cached digests and distances are worked out again when next needed.'''
+        self.digests, self.junctions = {}, None
+
+    def renderRows(self, overlay=None, window=None):
+        '''Yields the printable text of each row of the maze, or of just the part of it in <window> (see
+        viewport). Pieces are passed into <overlay> as a dict of {(row, column): cell character}, and are
+        drawn over the maze without modifying it.'''
+        cellStrs = cellStrings()
+        top, left, rows, cols = window or [0, 0, self.maze.rows, self.maze.cols]
+
+        # Group overlay pieces by row so rows without pieces are joined directly
+        overlayRows = {}
+        for (r, c), ch in (overlay or {}).items():
+            if left <= c < left + cols:
+                overlayRows.setdefault(r, []).append((c - left, ch))
+
+        for r in range(top, top + rows):
+            rowStrs = [cellStrs[code] for code in self.maze.rowSlice(r, left, left + cols)]
+            for c, ch in overlayRows.get(r, []):
+                rowStrs[c] = cellStrs[CELL_CODES[ch]]
+            yield "".join(rowStrs)
+
+    def viewport(self, center, size=None):
+        '''Returns the part of the maze to draw as [top row, left column, rows, columns]: all of it if it fits
+        in the terminal (or in <size> as [rows, columns], if given), else as much as fits, centred on the coords
+        <center> as far as the edges allow.'''
+        if size is None:
+            size = viewSize()
+        rows, cols = min(self.maze.rows, max(1, size[0])), min(self.maze.cols, max(1, size[1]))
+        top = max(0, min(center[0] - rows // 2, self.maze.rows - rows))
+        left = max(0, min(center[1] - cols // 2, self.maze.cols - cols))
+        return [top, left, rows, cols]
+
+    def printMaze(self, overlay=None, center=None, size=None):
+        '''Prints the maze in self.maze to the console, with any pieces in <overlay> drawn over it. Mazes too big
+        for the terminal (or for <size> as [rows, columns], if given) are cut down to the part around <center>
+        (or around the first piece, or the start).'''
+        printSeparator(36)
+        if center is None:
+            center = next(iter(overlay)) if overlay else self.start
+        window = self.viewport(center, size)
+
+        if globalPrintMode == 2:
+            # IDLE can only color text one write at a time, so write each cell separately
+            overlay = overlay or {}
+            for r in range(window[0], window[0] + window[2]):
+                for c in range(window[1], window[1] + window[3]):
+                    ch = overlay.get((r, c), CELL_CHARS[self.maze.get(r, c)])
+                    color.write(VISUAL_CHARS[ch] + " ", IDLE_COLORS[ch])
+                print()
+        else:
+            # Write the whole frame at once instead of one print per row
+            text = "\n".join(self.renderRows(overlay, window)) + "\n"
+            sys.stdout.write(text)
+            sys.stdout.flush()
+            profiler.count("bytes written", len(text))
+        if window[2:] != [self.maze.rows, self.maze.cols]:
+            print(f"(Rows {window[0]}-{window[0] + window[2] - 1} and columns {window[1]}-{window[1] + window[3] - 1} of {self.maze.rows} x {self.maze.cols})")
+        profiler.count("cells drawn", window[2] * window[3])
+
+    def movePiece(self, pos, user_input, invalid_spaces, notify=print):
+        '''Moves a piece (at the coords in <pos>) depending on user input, and checks if the move
+        is valid, else informing the user (through <notify>) that the move is invalid. The piece is only
+        drawn over the maze, so <pos> is updated in place and the maze data is never changed.
+        Returns True if moved.'''
+
+        # Map movements from user input to row/column changes, if the input is a move at all
+        moveMap = MOVE_STEPS.get(user_input.upper())
+        if moveMap is not None:
             # Apply movements to temporary var p, then apply validation checks (within maze / no stepping on invalid spaces)
-            p = [self.start[0]+moveMap[0], self.start[1]+moveMap[1]]
-            if IntInRange(p[0], 0, upperLimit[0]) and IntInRange(p[1], 0, upperLimit[1]) and self.maze[p[0]][p[1]] not in invalid_spaces:
-                # Update coords for piece, update maze representation
-                self.maze[p[0]][p[1]] = piece_repr
-                self.maze[self.start[0]][self.start[1]] = bgMazeObj.maze[self.start[0]][self.start[1]]
-                self.start = p.copy()
+            p = [pos[0]+moveMap[0], pos[1]+moveMap[1]]
+            if self.maze.inBounds(p[0], p[1]) and CELL_CHARS[self.maze.get(p[0], p[1])] not in invalid_spaces:
+                # Update coords for piece
+                pos[0], pos[1] = p
+                return True
             else:
-                print("\nInvalid Movement. Please try again.\n")
+                notify("\nInvalid Movement. Please try again.\n")
         else:
-            print("\nInvalid Input. Please try again.\n")
+            notify("\nInvalid Input. Please try again.\n")
+        return False
+
+    def applyMoves(self, pos, moves):
+        '''Moves a piece (at the coords in <pos>) through every key in <moves>, a string of W/A/S/D keys or a
+        list of upper case ones, in one call instead of one movePiece call per key. Stops at the first illegal
+        move: an invalid key, a wall, off the maze, or any move once the end is reached (the run is over there).
+        <pos> is updated in place like movePiece. Returns [pos, index of the first illegal move (-1 if none)].'''
+        if isinstance(moves, str):
+            moves = moves.upper()
+        cells, rows, cols, steps = self.maze.cells, self.maze.rows, self.maze.cols, MOVE_STEPS
+        (r, c), (er, ec) = pos, self.end
+        illegal = -1
+        for i, key in enumerate(moves):
+            step = steps.get(key)
+            if step is None or (r == er and c == ec):
+                illegal = i
+                break
+            nr, nc = r + step[0], c + step[1]
+            if not (0 <= nr < rows and 0 <= nc < cols) or cells[nr*cols + nc] == WALL:
+                illegal = i
+                break
+            r, c = nr, nc
+        pos[0], pos[1] = r, c
+        return [pos, illegal]
 
     def isLoaded(self):
         '''Checks if the maze has maze data loaded and returns the result.'''
-        if self.maze != []:
+        if self.maze.rows > 0:
             return True
         else:
             print("Maze not loaded!")
@@ -131,39 +631,53 @@ class Maze:
 
     def makeCopy(self):
         '''Makes a new Maze object with the same data as the caller and returns it.'''
-        newObject = Maze([], [0, 0], [0, 0])
-        newObject.maze = copy.deepcopy(self.maze)
-        newObject.start = self.start.copy()
-        newObject.end = self.end.copy()
+        newObject = Maze(self.maze.copy(), self.start.copy(), self.end.copy())
+        newObject.digests = self.digests.copy() # Same maze data, so the same digests
         return newObject
 
     def copyFrom(self, other):
         '''Copies data from the Maze object passed into <other> into the caller.'''
-        self.maze = copy.deepcopy(other.maze)
-        self.start = other.start.copy()
-        self.end = other.end.copy()
+        self.setMaze(other.maze.copy(), other.start.copy(), other.end.copy())
+        self.digests = other.digests.copy()
 
     def mazeToText(self):
         '''Returns a text representation of the maze data stored by the caller.'''
-        strRepr = []
-        for row in self.maze:
-            strRepr.append("".join(row))
-        return "\n".join(strRepr)
+        return self.maze.toText()
 
     def getMazeDigest(self):
-        '''Returns the MD5 hash of the maze stored by the caller in hexadecimal format.'''
-        encStrRep = self.mazeToText().encode('utf-8') # encode to utf-8 format
-        digest = hashlib.md5(encStrRep).hexdigest()
-        return digest
+        '''Returns the MD5 hash of the maze stored by the caller in hexadecimal format. This is the
+        maze's id on the leaderboards, and is only worked out again after the maze changes.'''
+        if "md5" not in self.digests:
+            with profiler.stage("maze.digest"):
+                self.digests["md5"] = self.maze.md5Digest()
+            profiler.count("digests computed")
+        return self.digests["md5"]
+
+    def getFastDigest(self):
+        '''Returns a quick (non-cryptographic) hash of the maze stored by the caller, for looking up
+        mazes within the program. Use getMazeDigest for ids that are saved to files.'''
+        if "fast" not in self.digests:
+            self.digests["fast"] = self.maze.fastDigest()
+        return self.digests["fast"]
+
+    def getJunctionGraph(self):
+        '''Returns the JunctionGraph of the maze stored by the caller (which also knows the fewest moves to
+        the end), only building it again after the maze changes. Returns None for tiled mazes, which are too
+        big to index all of.'''
+        if isinstance(self.maze, TiledGrid):
+            return None
+        if self.junctions is None:
+            self.junctions = JunctionGraph(self.maze, self.start, self.end)
+        return self.junctions
 
     def fetchBoard(self, l_board):
         '''Fetches the Board object from the Leaderboard object passed into <l_board> based
         on the maze data stored by the caller.'''
         return l_board.getBoard(self.getMazeDigest())
 
-    def updateWinToBoard(self, score, l_board):
+    def updateWinToBoard(self, score, l_board, moves=""):
         '''Handles maze wins, prompts and validates for player nickname, then calls the 
-        Leaderboard object in <l_board> to update with new values.'''
+        Leaderboard object in <l_board> to update with new values (including the run's move log <moves>).'''
         board = self.fetchBoard(l_board)
         rank = board.getRank(score) # Returns rank, zero indexed
         if rank >= 0:
@@ -180,116 +694,143 @@ class Maze:
                 else:
                     break
 
-            # Update board
-            board.players.insert(rank, Player(player_name, score))
-            board.players = board.players[:10]
-
-            # Update leaderboard
-            l_board.updateLeaderboard()
+            # Update board and leaderboard
+            with profiler.stage("leaderboard.record"):
+                l_board.recordWin(board, Player(player_name, score, moves))
         else:
             print("You weren't ranked... Try better next time!")
     
-    def printToPi(self):
-        '''Prints the maze to the display on a SenseHat. Requires this program to
-        be running on a Raspberry Pi with SenseHat attached.'''
-        for r in range(8):
-                for c in range(8):
-                    c_dict = {"X": [127,127,127], "O":[0, 0, 0], "A":[127,0,0], "B":[0,127,0]}
-                    rgb = c_dict[self.maze[r][c]]
-                    if r < len(self.maze) and c < len(self.maze):
-                        s.set_pixel(c,r,rgb[0],rgb[1],rgb[2]) # Print maze if can be printed
+    def piFrame(self, overlay=None, origin=(0, 0)):
+        '''Returns the SenseHat LED colors for the 8x8 view of the maze whose top left cell is at <origin>,
+        with any pieces in <overlay> drawn over it, as a list of 64 [r, g, b] lists (row by row).'''
+        overlay = overlay or {}
+        top, left = origin
+        frame = []
+        for r in range(top, top + PI_SIZE):
+            if 0 <= r < self.maze.rows:
+                row = self.maze.rowSlice(r, left, min(left + PI_SIZE, self.maze.cols))
+                for c in range(left, left + PI_SIZE):
+                    if c < self.maze.cols:
+                        frame.append(PI_COLORS[overlay.get((r, c), CELL_CHARS[row[c - left]])])
                     else:
-                        s.set_pixel(c,r,127,127,127) # Set rest to white
+                        frame.append(PI_OUTSIDE) # Set rest to white
+            else:
+                frame.extend([PI_OUTSIDE] * PI_SIZE)
+        return frame
 
 ########## NOTE: CLASS APPLICATIONS ###########
 
-    def loadMaze(self):
-        '''Loads the data from a file as text, converts the data into a suitable
-        format for Maze objects and writes the data to the caller Maze object.'''
-
-        # Validation for .csv file
-        file_name = input("Enter name of the data file: ").split('.')
-        if len(file_name) != 2 or file_name[1] != "csv":
-            print("Invalid .csv file!")
-            return None
-        file_name = ".".join(file_name)
+    def loadMaze(self, file_name=None):
+        '''Loads the data from a file (asking the user for its name unless <file_name> is given), validates
+        it and writes it to the caller Maze object. Returns True if the maze was loaded.'''
 
+        if file_name is None:
+            file_name = input("Enter name of the data file: ")
         try:
-            with open(file_name) as f:
-
-                r_maze = [] # Read-maze
-                for line in f.readlines():
-                    # strips whitespace, seperates the string into a list of characters and appends it to r_maze
-                    r_maze.append(list(line.strip()))
-
-            # Validate maze is square or rectangle
-            validate_shape = len(r_maze[0])
-            for line in r_maze:
-                if len(line) != validate_shape:
-                    print("Maze should be of shape square or rectangle, not uneven!")
-                    return None
-            
-            # Validate maze has only 1 set of start and end points
-            abResult = verifyAB(r_maze, "A", "B")
-            if abResult[0] == False:
-                return None
-
-            print(f"Number of lines read: {len(r_maze)}")
-            # Write maze
-            self.maze, self.start, self.end = r_maze, abResult[1], abResult[2]
+            with profiler.stage("maze.load"):
+                r_grid, start, end = openMazeFile(file_name)
         except FileNotFoundError:
             print("File Not Found.\n")
+            return False
+        except OSError as e: # A directory, no permission...
+            print(f"Couldn't read {file_name}! {e.strerror or e}")
+            return False
+        except ValueError as e:
+            print(e)
+            return False
+
+        print(f"Number of lines read: {r_grid.rows}")
+        if isinstance(self.maze, Grid): # The previous maze's file isn't needed anymore
+            self.maze.close()
+        # Write maze
+        self.setMaze(r_grid, start, end)
+        return True
 
     def playMaze(self, isTerminal):
         '''Allows the user to play with the maze.'''
-        fg_m = self.makeCopy() # Make temporary foreground Maze object
-        bg_m = self.makeCopy() # Make temporary background Maze object
-        pi_verify = len(fg_m.maze) <= 8 or len(fg_m.maze[0]) <= 8 # Caps pi maze to max dimensions: 8x8
-        # Verify that the maze has only 1 start and end, and when set to Pi Mode, verifies that the maze is within dimensions
-        if verifyAB(fg_m.maze, "A", "B")[0] and (not isTerminal or pi_verify):
-            bg_m.maze[bg_m.start[0]][bg_m.start[1]] = "O" # Remove player for bg and set to proper background character "O"
-            startTime = time.time() # Start timer for scoring
+        pos = self.start.copy() # Player position, drawn over the maze instead of being written into a copy of it
+        # Verify that the maze has only 1 start and end. Mazes bigger than the SenseHat scroll to follow the player.
+        if verifyAB(self.maze, "A", "B")[0]:
+            renderer, notices = TerminalRenderer(self), [] # notices collects messages to show under the next frame
+            moveLog = [] # [key, seconds since the previous move] for every move made, to verify the run later
+            guide = self.getJunctionGraph() # Fewest moves to the end from every cell, for hints and par
+            par = guide.get(self.start[0], self.start[1]) if guide else "?"
+            if not isTerminal:
+                reader, display = getPiInput(), PiRenderer(self)
+                reader.reset() # Ignore presses from before the game started
+            startTime = lastMoveTime = time.time() # Start timer for scoring
             while True:
-                if isTerminal:
-                    fg_m.printMaze()
-
-                    print(f"\nLocation of Start (A) = (Row {fg_m.start[0]}, Column {fg_m.start[1]})")
-                    print(f"Location of End (B) = (Row {fg_m.end[0]}, Column {fg_m.end[1]})\n")
-                else:
-                    fg_m.printToPi()
-
-                if fg_m.start == fg_m.end:
+                # Draw the player over the start as a proper background character "O"
+                overlay = {tuple(self.start): "O"}
+                overlay[tuple(pos)] = "A"
+                with profiler.stage("play.draw"):
+                    if isTerminal:
+                        renderer.draw(overlay, notices + [
+                            f"\nLocation of Start (A) = (Row {pos[0]}, Column {pos[1]})",
+                            f"Location of End (B) = (Row {self.end[0]}, Column {self.end[1]})",
+                            f"Moves made: {len(moveLog)} (par {par}), fewest moves left: {guide.get(pos[0], pos[1]) if guide else '?'}\n"], pos)
+                        notices = []
+                    else:
+                        display.draw(overlay, pos)
+                        reader.markRendered()
+                        if notices:
+                            print("".join(notices))
+                            notices = []
+                profiler.count("frames")
+
+                if pos == self.end:
                     timeTaken = round(time.time() - startTime, 2)
                     print("Congratulations! You win! ~\n")
+                    print(f"You took {len(moveLog)} moves (par {par}).")
                     if isTerminal:
-                        self.updateWinToBoard(timeTaken, leaderboard)
+                        self.updateWinToBoard(timeTaken, getLeaderboard("leaderboard"), encodeMoveLog(moveLog))
                     else:
-                        self.updateWinToBoard(timeTaken, pi_leaderboard)
+                        self.updateWinToBoard(timeTaken, getLeaderboard("pi_leaderboard"), encodeMoveLog(moveLog))
                         s.clear()
                     break
 
                 # Get user input
-                if isTerminal:
-                    user_input = input("Press 'W' for UP, 'A' for LEFT, 'S' for DOWN, 'D' for RIGHT, 'M' for MAIN MENU: ")
-                else:
-                    user_input = inputFromPi()
+                with profiler.stage("play.input"):
+                    if isTerminal:
+                        user_input = input("Press 'W' for UP, 'A' for LEFT, 'S' for DOWN, 'D' for RIGHT, 'H' for a HINT, 'M' for MAIN MENU: ")
+                    else:
+                        user_input = inputFromPi()
 
                 # Move with validation and break when required
                 if user_input.upper() == "M":
                     break
+                elif user_input.upper() == "H":
+                    if guide:
+                        notices.append(f"\nHint: press '{guide.hint(pos)}' to get closer to the end.\n")
+                    else:
+                        notices.append("\nHints aren't available for mazes this big.\n")
                 else:
-                    fg_m.movePiece("A", bg_m, user_input, ["X"])
+                    with profiler.stage("play.move"):
+                        before = guide.get(pos[0], pos[1]) if guide else 0
+                        if self.movePiece(pos, user_input, ["X"], notices.append):
+                            moveTime = time.time()
+                            moveLog.append([user_input.upper(), moveTime - lastMoveTime])
+                            lastMoveTime = moveTime
+                            if guide and guide.get(pos[0], pos[1]) > before:
+                                notices.append("\nWrong way! That move took you further from the end.\n")
+
+            if not isTerminal:
+                reader.printLatency()
         else: 
             print("Maze cannot be played!")
 
     def configureMaze(self):
         '''Allows the user to edit the maze'''
-        bg_m = self.makeCopy() # Make fg, bg like playmaze
-        fg_m = self.makeCopy() # bg in this case is the actual maze we want to export.
-        fg_m.maze[0][0], fg_m.start, brush_mode = "+", [0, 0], 0 # Initialise cursor piece
+        if isinstance(self.maze, TiledGrid):
+            print("Maze is too big to edit! Only mazes that fit in memory can be edited.")
+            return
+        edit_m = self.makeCopy() # edit_m is the actual maze we want to export, so changes can be thrown away
+        cursor, brush_mode = [0, 0], 0 # Initialise cursor piece, drawn over edit_m like the player in playMaze
+        editor = MazeEditor(edit_m) # Makes every change to edit_m, so it can be undone
 
         while True:
-            fg_m.printMaze()
+            drawStart = profiler.start()
+            edit_m.printMaze({tuple(cursor): "+"})
             print("\nKEYBINDS\n"+"="*8)
             options = {
                 1:"Set normal cursor",
@@ -297,6 +838,12 @@ class Maze:
                 3:"Toggle Passageway Brush",
                 4:"Set to Start",
                 5:"Set to End",
+                6:"Fill rectangle from cursor",
+                7:"Draw line from cursor",
+                8:"Flood fill from cursor",
+                9:"Paste file at cursor",
+                "U":"Undo",
+                "R":"Redo",
                 "W":"Move up",
                 "A":"Move left",
                 "S":"Move right",
@@ -305,14 +852,25 @@ class Maze:
                 0:"Exit to Main Menu"
                 }
             print(f"Cursor Mode: {['normal', 'wall', 'passage'][brush_mode]}")
-            user_input = displayMenu(options, "Enter key (Adding a start/end point will reset the cursor to normal mode): ", "Invalid key!")
+            start = locateCell(edit_m.maze, START)
+            if start is None or editor.field.end is None:
+                print("Solvable: needs exactly 1 start and 1 end")
+            elif editor.field.get(start[0], start[1]) >= 0:
+                print(f"Solvable: yes, in {editor.field.get(start[0], start[1])} moves")
+            else:
+                print("Solvable: no, the end can't be reached from the start")
+            profiler.stop("edit.draw", drawStart)
+            profiler.count("frames")
+            with profiler.stage("edit.input"):
+                user_input = displayMenu(options, "Enter key (Adding a start/end point will reset the cursor to normal mode): ", "Invalid key!")
+            applyStart = profiler.start()
             
             if type(user_input) == int and IntInRange(user_input, -1, 5): # Do actions for options 0 through 5 (-1 is for error code handling)
                 if user_input == 0: # Exit Maze
 
-                    abResult = verifyAB(bg_m.maze, "A", "B")
-                    if abResult[0] and input("Confirm exit editor mode? [Y/N]: ").upper() == "Y":
-                        bg_m.start, bg_m.end = abResult[1].copy(), abResult[2].copy() # Copy over start and end coordinates
+                    abResult = verifyAB(edit_m.maze, "A", "B")
+                    if abResult[0] and verifySolvable(edit_m.maze, abResult[1], abResult[2]) and input("Confirm exit editor mode? [Y/N]: ").upper() == "Y":
+                        edit_m.start, edit_m.end = abResult[1].copy(), abResult[2].copy() # Copy over start and end coordinates
                         break
                         
                 elif IntInRange(user_input, 1, 3): # toggle brush mode
@@ -320,56 +878,88 @@ class Maze:
 
                 elif IntInRange(user_input, 4, 5): # Set the char at cursor to start/end
                     brush_mode = 0
-                    bg_m.maze[fg_m.start[0]][fg_m.start[1]] = ["A", "B"][user_input-4]
+                    editor.setCell(cursor[0], cursor[1], [START, END][user_input-4])
                     
                 # If (-1), don't do anything.
+            elif type(user_input) == int: # Bulk edits from the cursor (options 6 through 9)
+                brush_mode = 0
+                try:
+                    if user_input == 9:
+                        changed = editor.paste(input("Enter name of the file to paste: "), cursor[0], cursor[1])
+                    else:
+                        code = cellCode(input("Enter cell to fill with (X/O): "), "XO")
+                        if user_input == 8:
+                            changed = editor.floodFill(cursor[0], cursor[1], code)
+                        else:
+                            r = IntInput("Enter row of the other end: ", 0, edit_m.maze.rows-1)
+                            c = IntInput("Enter column of the other end: ", 0, edit_m.maze.cols-1)
+                            changed = [editor.fillRect, editor.drawLine][user_input-6](cursor[0], cursor[1], r, c, code)
+                    print(f"{changed} cells changed.")
+                except (OSError, ValueError) as e:
+                    print(e)
             else:
                 if user_input == "F": # Force quit to main
                     return
-                fg_m.movePiece("+", bg_m, user_input, []) # Move piece with no invalid spaces
+                elif user_input == "U":
+                    if not editor.undo():
+                        print("Nothing to undo!")
+                elif user_input == "R":
+                    if not editor.redo():
+                        print("Nothing to redo!")
+                else:
+                    edit_m.movePiece(cursor, user_input, []) # Move piece with no invalid spaces
 
             if brush_mode != 0: # Overwrite any char under cursor as long as brush mode is on
-                bg_m.maze[fg_m.start[0]][fg_m.start[1]] = ["X", "O"][brush_mode-1]
+                editor.setCell(cursor[0], cursor[1], [WALL, PASSAGE][brush_mode-1])
+            profiler.stop("edit.apply", applyStart)
 
         
         if input("Save edited maze to current maze? [Y/N]: ").upper() == "Y":
-            self.copyFrom(bg_m) # Save changes
-
-    def exportMaze(self):
-        '''Prompts user for a valid .csv filename and then exports the current maze under that filename.'''
-
-        # Get valid filename
-        while True:
-            file_name = input("Enter filename to save to: ").split(".")
-            if len(file_name) == 2 and file_name[1] == "csv" and "/" not in file_name:
-                break
-            else:
-                print("Invalid filename for export!")
-                return
-        file_name = ".".join(file_name)
+            self.setMaze(edit_m.maze, edit_m.start, edit_m.end) # Save changes, edit_m is discarded
+
+    def exportMaze(self, file_name=None):
+        '''Exports the current maze to the file <file_name> (asking the user for its name unless given), as text
+        (.csv, or compressed as .csv.gz or .csv.xz) or packed (.mzb) going by its extension. The rows are streamed
+        straight from the grid, and the file is only replaced once it's complete. Returns True if it was exported.'''
+
+        if file_name is None:
+            file_name = input(f"Enter filename to save to ({', '.join('.' + fmt for fmt in MAZE_FORMATS)}): ")
+        fileFormat = mazeFileFormat(file_name)
+        if fileFormat is None or os.path.basename(file_name) == "." + fileFormat:
+            print("Invalid filename for export!")
+            return False
 
-        # Do the actual writing
-        with open(file_name, 'w') as f:
-            raw = self.mazeToText().split()
-            for line in raw:
-                f.write("".join(list(line)) + "\n")
-            f.truncate()
-        print(f"File {file_name} created with {len(raw)} records.")
+        try:
+            with profiler.stage("maze.export"):
+                # Packed mazes can't be edited, so they are still as verified when they were opened
+                verified = fileFormat == "mzb" and (isinstance(self.maze, PackedGrid) or isSolvableMaze(self.maze, self.start, self.end))
+                rows = writeMazeFile(self.maze, file_name, verified)
+        except OSError as e:
+            print(f"Couldn't export the maze to {file_name}! {e.strerror or e}")
+            return False
+        print(f"File {file_name} created with {rows} records.")
+        return True
 
     def createNewMaze(self):
         '''Allows the user to generate a new maze object and overwrites the current maze with it'''
         if input("This will empty the current maze. Are you sure [Y/N]: ").upper() == "Y":
-            new_xy = input("Enter dimensions of new maze. Min dimensions: (2,2), Max dimensions: (33,33). (row, column): ").split(",")
+            new_xy = input(f"Enter dimensions of new maze. Min dimensions: (2,2), Max dimensions: ({MAX_DIMENSION},{MAX_DIMENSION}). (row, column): ").split(",")
             # Validation! Check for proper number of elements, if they are digits, in range, etc.
-            if len(new_xy) == 2 and new_xy[0].isdigit() and new_xy[1].isdigit() and IntInRange(int(new_xy[0]), 2, 33) and IntInRange(int(new_xy[1]), 2, 33):
+            if len(new_xy) == 2 and new_xy[0].strip().isdigit() and new_xy[1].strip().isdigit() and IntInRange(int(new_xy[0]), 2, MAX_DIMENSION) and IntInRange(int(new_xy[1]), 2, MAX_DIMENSION):
                 
-                newMaze, rows, cols = [], int(new_xy[0]), int(new_xy[1])
-                # Generate actual maze
-                for _ in range(rows):
-                    newMaze.append(['O']*cols)
+                rows, cols = int(new_xy[0]), int(new_xy[1])
+                options = {1:"Blank maze", 2:"Generate with recursive backtracker", 3:"Generate with Kruskal's algorithm", 4:"Generate with Eller's algorithm"}
+                layout = displayMenu(options, "Choose a layout for the new maze: ", "Invalid option!")
+                if layout == -1:
+                    return
 
-                # Copy maze to current maze
-                self.copyFrom(Maze(newMaze, [0,0], [0,0]))
+                # Generate actual maze (a blank Grid starts out filled with passages) and write it to the current maze
+                if layout == 1:
+                    self.setMaze(Grid(rows, cols), [0,0], [0,0])
+                else:
+                    seed = input("Enter a seed to generate from (leave blank for a random maze): ")
+                    generated = generateMaze(rows, cols, ["backtracker", "kruskal", "eller"][layout-2], seed if seed != "" else None)
+                    self.setMaze(generated.maze, generated.start, generated.end)
                 print(f"A new maze of {rows} by {cols} has been created.")
 
                 # Ask user to choose next step
@@ -387,9 +977,9 @@ class Maze:
             # Fetch appropriate leaderboard depending on user input
             choice = displayMenu(options, "Choose a leaderboard: ", "Invalid option!")
             if choice == 1:
-                board = self.fetchBoard(leaderboard)
+                board = self.fetchBoard(getLeaderboard("leaderboard"))
             elif choice == 2:
-                board = self.fetchBoard(pi_leaderboard)
+                board = self.fetchBoard(getLeaderboard("pi_leaderboard"))
             else:
                 return None
 
@@ -403,85 +993,887 @@ class Maze:
 
 ########### NOTE: MAZE CLASS DEFINITION END ###########
 
+########### NOTE: EDITOR CLASS DEFINITION START ###########
+
+class MazeEditor:
+
+    # NOTE: class init declaration
+    def __init__(self, maze):
+        '''Create an editor that makes changes to the (unpacked) Maze object passed into <maze>. Each edit
+        writes whole runs of cells at once and is saved as a diff of only the cells it covered, which
+        undo() and redo() write back, so history grows with the cells changed and not with the maze size.
+        A DistanceField to the end is kept up to date as cells change, to show if the maze can be solved.'''
+        self.maze = maze
+        self.field = DistanceField(maze.maze, locateCell(maze.maze, END))
+        self.undoStack, self.redoStack = [], [] # Edits, each a list of [first flat index, old cells, new cells] runs
+
+########### NOTE: CLASS METHODS ###########
+
+    def apply(self, runs):
+        '''Writes the runs of cells in <runs> (a list of [first flat index, cell codes as bytes]) to the maze
+        as one edit that can be undone. Returns the number of cells that changed.'''
+        cells, diff, changed = self.maze.maze.cells, [], 0
+        for first, new in runs:
+            old = bytes(cells[first:first + len(new)])
+            if old != new:
+                diff.append([first, old, bytes(new)])
+                changed += sum(a != b for a, b in zip(old, new))
+        if diff:
+            self.undoStack.append(diff)
+            self.redoStack.clear()
+            self.write(diff, 2)
+        return changed
+
+    def write(self, diff, side):
+        '''Writes the old (<side> 1) or new (<side> 2) cells of each run in the edit <diff> to the maze, and
+        brings the DistanceField up to date: small edits repair it one cell at a time, while edits that
+        move the end or cover more than FIELD_REPAIR_LIMIT cells build a new one.'''
+        grid = self.maze.maze
+        if sum(len(run[side]) for run in diff) > FIELD_REPAIR_LIMIT or any(END in run[1] or END in run[2] for run in diff):
+            for run in diff:
+                grid.cells[run[0]:run[0] + len(run[side])] = run[side]
+            self.field = DistanceField(grid, locateCell(grid, END))
+        else:
+            for run in diff:
+                for k, code in enumerate(run[side]):
+                    old, i = grid.cells[run[0] + k], run[0] + k
+                    grid.cells[i] = code
+                    if (old == WALL) != (code == WALL):
+                        self.field.update(i // grid.cols, i % grid.cols)
+        self.maze.markChanged()
+
+    def undo(self):
+        '''Takes back the last edit. Returns False if there was nothing to undo.'''
+        if not self.undoStack:
+            return False
+        diff = self.undoStack.pop()
+        self.write(diff, 1)
+        self.redoStack.append(diff)
+        return True
+
+    def redo(self):
+        '''Makes the last undone edit again. Returns False if there was nothing to redo.'''
+        if not self.redoStack:
+            return False
+        diff = self.redoStack.pop()
+        self.write(diff, 2)
+        self.undoStack.append(diff)
+        return True
+
+    def checkCell(self, r, c):
+        '''Raises ValueError if row <r>, column <c> is outside the maze.'''
+        if not self.maze.maze.inBounds(r, c):
+            raise ValueError(f"Row {r}, column {c} is outside the maze!")
+
+    def setCell(self, r, c, code):
+        '''Sets the cell at row <r>, column <c> to the cell code <code>. Returns the number of cells changed.'''
+        self.checkCell(r, c)
+        return self.apply([[r*self.maze.maze.cols + c, bytes([code])]])
+
+    def fillRect(self, r1, c1, r2, c2, code):
+        '''Sets every cell in the rectangle with corners at (<r1>, <c1>) and (<r2>, <c2>) to the cell code
+        <code>, one run per row. Returns the number of cells changed.'''
+        self.checkCell(r1, c1)
+        self.checkCell(r2, c2)
+        (top, bottom), (left, right), cols = sorted((r1, r2)), sorted((c1, c2)), self.maze.maze.cols
+        return self.apply([[r*cols + left, bytes([code]) * (right - left + 1)] for r in range(top, bottom + 1)])
+
+    def drawLine(self, r1, c1, r2, c2, code):
+        '''Sets the cells along the line from (<r1>, <c1>) to (<r2>, <c2>) to the cell code <code>. The line
+        only steps up, down, left or right, so a line of passage can always be walked along.
+        Returns the number of cells changed.'''
+        self.checkCell(r1, c1)
+        self.checkCell(r2, c2)
+        sr, sc = (r2 > r1) - (r2 < r1), (c2 > c1) - (c2 < c1)
+        r, c, points = r1, c1, [(r1, c1)]
+        while (r, c) != (r2, c2):
+            # Step along whichever axis keeps the line closest to the straight line between the ends
+            offRow = abs((r + sr - r1) * (c2 - c1) - (c - c1) * (r2 - r1))
+            offCol = abs((r - r1) * (c2 - c1) - (c + sc - c1) * (r2 - r1))
+            if c == c2 or (r != r2 and offRow <= offCol):
+                r += sr
+            else:
+                c += sc
+            points.append((r, c))
+        cols = self.maze.maze.cols
+        return self.apply([[r*cols + c, bytes([code])] for r, c in points])
+
+    def floodFill(self, r, c, code):
+        '''Sets the cell at row <r>, column <c> and every cell of the same kind joined to it to the cell code
+        <code>, filling a row segment at a time. Returns the number of cells changed.'''
+        self.checkCell(r, c)
+        grid = self.maze.maze
+        cells, cols, target = grid.cells, grid.cols, grid.get(r, c)
+        if target == code:
+            return 0
+        seen, runs, stack = bytearray(len(cells)), [], [r*cols + c]
+        while stack:
+            i = stack.pop()
+            if seen[i] or cells[i] != target:
+                continue
+            # Widen to the whole segment of the row, then look for segments above and below it
+            row = i // cols * cols
+            left, right = i, i
+            while left > row and cells[left - 1] == target and not seen[left - 1]:
+                left -= 1
+            while right < row + cols - 1 and cells[right + 1] == target and not seen[right + 1]:
+                right += 1
+            seen[left:right + 1] = b"\x01" * (right - left + 1)
+            runs.append([left, bytes([code]) * (right - left + 1)])
+            for j in range(left, right + 1):
+                for k in (j - cols, j + cols):
+                    if 0 <= k < len(cells) and not seen[k] and cells[k] == target:
+                        stack.append(k)
+        return self.apply(runs)
+
+    def paste(self, file_name, r, c):
+        '''Pastes the cells in the file <file_name> (see readPatchFile) with their top left corner at row <r>,
+        column <c>, leaving out anything that falls outside the maze. Returns the number of cells changed.'''
+        self.checkCell(r, c)
+        grid = self.maze.maze
+        rows = readPatchFile(file_name)[:grid.rows - r]
+        return self.apply([[(r + k)*grid.cols + c, row[:grid.cols - c]] for k, row in enumerate(rows)])
+
+    def runScript(self, file_name):
+        '''Makes the edits in the script file <file_name> without asking for anything. Each line is one
+        operation from SCRIPT_OPERATIONS (e.g. "fill 0 0 4 9 X"), with rows and columns counted from 0 and
+        # starting a comment. Files to paste are found next to the script. Returns the number of
+        operations made, or raises ValueError saying which line is invalid.'''
+        operations = 0
+        with open(file_name, 'r') as f:
+            for line_no, line in enumerate(f, 1):
+                words = line.split("#")[0].split()
+                if not words:
+                    continue
+                name, args = words[0].lower(), words[1:]
+                if name not in SCRIPT_OPERATIONS:
+                    raise ValueError(f"Line {line_no}: Unknown operation {words[0]!r}, expected one of: {', '.join(SCRIPT_OPERATIONS)}!")
+                if len(args) != len(SCRIPT_OPERATIONS[name].split()):
+                    raise ValueError(f"Line {line_no}: Expected {(name + ' ' + SCRIPT_OPERATIONS[name]).strip()}!")
+                try:
+                    if name in ("undo", "redo"):
+                        getattr(self, name)()
+                    elif name == "paste":
+                        self.paste(os.path.join(os.path.dirname(file_name), args[0]), int(args[1]), int(args[2]))
+                    else:
+                        operation = {"set": self.setCell, "fill": self.fillRect, "line": self.drawLine, "flood": self.floodFill}[name]
+                        operation(*[int(arg) for arg in args[:-1]], cellCode(args[-1]))
+                except (OSError, ValueError) as e:
+                    raise ValueError(f"Line {line_no}: {e}")
+                operations += 1
+        return operations
+
+########### NOTE: EDITOR CLASS DEFINITION END ###########
+
+########### NOTE: RENDERER CLASS DEFINITION START ###########
+
+class TerminalRenderer:
+
+    # NOTE: class init declaration
+    def __init__(self, maze, out=None):
+        '''Create a renderer that draws the Maze object passed into <maze> to the text stream <out>
+        (stdout by default). With color highlighting for terminals, the first frame is drawn in full and
+        every frame after that only redraws the cells that changed, using ANSI cursor positioning. Mazes
+        too big for the terminal are drawn as a window (see Maze.viewport) centred on the player.'''
+        self.maze, self.out = maze, out if out is not None else sys.stdout
+        self.drawn = None # Overlay of the frame currently on screen, None until a full frame is drawn
+        self.window = None # [top row, left column, rows, columns] of the part of the maze on screen
+        self.useDiff = globalPrintMode == 1
+        self.cellStrs = cellStrings()
+
+########### NOTE: CLASS METHODS ###########
+
+    def draw(self, overlay, status, center):
+        '''Draws the maze with the pieces in <overlay> (see Maze.renderRows), centred on the coords <center>
+        if it doesn't fit, and the lines of text in <status> underneath it.'''
+        if globalPrintMode == 2:
+            # IDLE can't move the cursor, so fall back to printing everything again
+            self.maze.printMaze(overlay, center)
+            print("\n".join(status))
+            return
+
+        window = self.maze.viewport(center)
+        if self.useDiff and self.drawn is not None and window == self.window:
+            frame = self.changedCells(overlay)
+            profiler.count("cells drawn", len(frame))
+            frame.append(f"\033[{FRAME_TOP + window[2] + 1};1H\033[J") # Clear old status and prompt text
+        else:
+            frame = ["\033[2J\033[H"] if self.useDiff else [] # Clear the screen so cells can be found again
+            frame.append("="*36 + "\n\n")
+            frame.extend(line + "\n" for line in self.maze.renderRows(overlay, window))
+            profiler.count("cells drawn", window[2] * window[3])
+        frame.append("\n".join(status) + "\n")
+
+        text = "".join(frame)
+        self.out.write(text)
+        self.out.flush()
+        profiler.count("bytes written", len(text))
+        self.drawn, self.window = dict(overlay), window
+
+        # Status text (and the prompt and Enter after it) taller than the lines kept free scrolls the screen,
+        # so the cells are no longer where changedCells would put them. The next frame is drawn in full.
+        statusLines = "\n".join(status).count("\n") + 1
+        if window[2] + statusLines + 2 > viewSize()[0] + VIEW_STATUS_LINES:
+            self.drawn = None
+
+    def changedCells(self, overlay):
+        '''Returns a list of text that redraws only the cells on screen whose pieces were added, moved or
+        removed since the last frame, each preceded by the ANSI sequence that puts the cursor on that cell.'''
+        grid, parts = self.maze.maze, []
+        top, left, rows, cols = self.window
+        for r, c in set(self.drawn) | set(overlay):
+            if not (top <= r < top + rows and left <= c < left + cols):
+                continue
+            old = self.drawn.get((r, c), CELL_CHARS[grid.get(r, c)])
+            new = overlay.get((r, c), CELL_CHARS[grid.get(r, c)])
+            if old != new:
+                parts.append(f"\033[{FRAME_TOP + r - top + 1};{2*(c - left) + 1}H" + self.cellStrs[CELL_CODES[new]])
+        return parts
+
+class PiRenderer:
+
+    # NOTE: class init declaration
+    def __init__(self, maze):
+        '''Create a renderer that draws the Maze object passed into <maze> to the SenseHat. The LED matrix
+        shows an 8x8 view of the maze that scrolls to follow the player, and only the LEDs that changed
+        since the last frame are written.'''
+        self.maze = maze
+        self.origin = [0, 0] # [row, column] of the maze cell in the top left LED
+        self.drawn = None # LED colors currently shown, None until a full frame is written
+
+########### NOTE: CLASS METHODS ###########
+
+    def follow(self, pos):
+        '''Scrolls the view so the player at <pos> stays at least PI_MARGIN cells from its edges,
+        without scrolling past the edges of the maze.'''
+        for axis, size in enumerate((self.maze.maze.rows, self.maze.maze.cols)):
+            first = self.origin[axis]
+            if pos[axis] < first + PI_MARGIN:
+                first = pos[axis] - PI_MARGIN
+            elif pos[axis] > first + PI_SIZE - 1 - PI_MARGIN:
+                first = pos[axis] - (PI_SIZE - 1 - PI_MARGIN)
+            self.origin[axis] = max(0, min(first, size - PI_SIZE))
+
+    def draw(self, overlay, pos):
+        '''Draws the maze with the pieces in <overlay> (see Maze.renderRows) to the SenseHat, scrolled to
+        the player at <pos>. Nothing is written when no LED changed, a move that doesn't scroll
+        writes just the LEDs the player left and entered, and anything else is one write of all 64.'''
+        self.follow(pos)
+        frame = self.maze.piFrame(overlay, self.origin)
+        changed = range(PI_SIZE * PI_SIZE)
+        if self.drawn is None:
+            s.set_pixels(frame)
+        else:
+            changed = [i for i in changed if frame[i] != self.drawn[i]]
+            if len(changed) <= 2:
+                for i in changed:
+                    s.set_pixel(i % PI_SIZE, i // PI_SIZE, frame[i])
+            else:
+                s.set_pixels(frame)
+        profiler.count("cells drawn", len(changed))
+        self.drawn = frame
+
+########### NOTE: RENDERER CLASS DEFINITION END ###########
+
+########### NOTE: SENSEHAT CLASS DEFINITION START ###########
+
+class PiInput:
+
+    # NOTE: class init declaration
+    def __init__(self, stick):
+        '''Create a joystick reader for the SenseHat joystick <stick>. A background thread blocks on the
+        joystick until it is pressed and queues the key straight away, so there is no polling delay and
+        nothing runs while the joystick is idle. Also measures the time from each press to the next render.'''
+        self.stick, self.keys = stick, queue.Queue()
+        self.lastInputTime, self.latencies = None, [] # Input-to-render latencies in seconds
+        threading.Thread(target=self.readEvents, daemon=True).start()
+
+########### NOTE: CLASS METHODS ###########
+
+    def readEvents(self):
+        '''Queues every joystick press as [key, time pressed]. Runs in the background thread.'''
+        while True:
+            event = self.stick.wait_for_event()
+            if event.action == "pressed" and event.direction in PI_DIRECTIONS:
+                self.keys.put([PI_DIRECTIONS[event.direction], time.perf_counter()])
+
+    def get(self):
+        '''Waits for the next joystick press and returns its key.'''
+        key, self.lastInputTime = self.keys.get()
+        return key
+
+    def reset(self):
+        '''Throws away queued presses and latencies from before now.'''
+        while not self.keys.empty():
+            self.keys.get_nowait()
+        self.lastInputTime, self.latencies = None, []
+
+    def markRendered(self):
+        '''Records the latency from the last joystick press to now, when its frame has been rendered.'''
+        if self.lastInputTime is not None:
+            self.latencies.append(time.perf_counter() - self.lastInputTime)
+            self.lastInputTime = None
+
+    def printLatency(self):
+        '''Prints the average and worst input-to-render latency since the last reset.'''
+        if self.latencies:
+            print(f"Input-to-render latency: {1000 * sum(self.latencies) / len(self.latencies):.2f}ms average, "
+                  f"{1000 * max(self.latencies):.2f}ms worst over {len(self.latencies)} moves")
+
+FakeInputEvent = collections.namedtuple("InputEvent", ["timestamp", "direction", "action"])
+
+class FakeStick:
+
+    # NOTE: class init declaration
+    def __init__(self, keyboard=False):
+        '''Create a stand-in for the SenseHat joystick. Presses are made with press() or pressKeys(), and
+        <keyboard> says whether inputFromPi should read presses from the keyboard.'''
+        self.events, self.keyboard = queue.Queue(), keyboard
+
+########### NOTE: CLASS METHODS ###########
+
+    def press(self, direction):
+        '''Presses and releases the joystick in <direction> ("up", "down", "left", "right" or "middle").'''
+        for action in ["pressed", "released"]:
+            self.events.put(FakeInputEvent(time.time(), direction, action))
+
+    def pressKeys(self, keys):
+        '''Presses the joystick once for every W/A/S/D/M key in the string <keys>. Returns the number of presses.'''
+        directions = {key: direction for direction, key in PI_DIRECTIONS.items()}
+        pressed = [key for key in keys.upper() if key in directions]
+        for key in pressed:
+            self.press(directions[key])
+        return len(pressed)
+
+    def wait_for_event(self, emptybuffer=False):
+        '''Waits for the next joystick event and returns it, like SenseStick.wait_for_event.'''
+        return self.events.get()
+
+    def get_events(self):
+        '''Returns every joystick event waiting, like SenseStick.get_events.'''
+        events = []
+        while not self.events.empty():
+            events.append(self.events.get_nowait())
+        return events
+
+class FakeSenseHat:
+
+    # NOTE: class init declaration
+    def __init__(self, keyboard=False):
+        '''Create an in-process stand-in for a SenseHat, so SenseHat play can be tested and benchmarked
+        without a Raspberry Pi. The LED matrix is kept in self.pixels (64 [r, g, b] lists, row by row) and
+        every write to it is counted in self.writes, like transactions on the real SenseHat's bus.'''
+        self.stick = FakeStick(keyboard)
+        self.pixels, self.writes = [[0, 0, 0] for _ in range(64)], 0
+
+########### NOTE: CLASS METHODS ###########
+
+    def set_pixel(self, x, y, *rgb):
+        '''Sets the LED at column <x>, row <y> to an [r, g, b] list or to r, g, b values.'''
+        self.pixels[y*8 + x] = list(rgb[0]) if len(rgb) == 1 else list(rgb)
+        self.writes += 1
+
+    def set_pixels(self, pixel_list):
+        '''Sets all 64 LEDs at once from a list of [r, g, b] lists.'''
+        self.pixels = [list(rgb) for rgb in pixel_list]
+        self.writes += 1
+
+    def get_pixels(self):
+        '''Returns a copy of all 64 LEDs as a list of [r, g, b] lists.'''
+        return [rgb.copy() for rgb in self.pixels]
+
+    def clear(self, *rgb):
+        '''Sets every LED to black, or to the color given.'''
+        self.set_pixels([list(rgb[0]) if len(rgb) == 1 else list(rgb or (0, 0, 0))] * 64)
+
+########### NOTE: SENSEHAT CLASS DEFINITION END ###########
+
+########### NOTE: PROFILER CLASS DEFINITION START ###########
+
+class Profiler:
+
+    # NOTE: class init declaration
+    def __init__(self):
+        '''Create a profiler that records how long each stage of the game takes, in histograms with the
+        fixed buckets in PROFILE_BUCKETS, and counts the work done (cells drawn, bytes written...). Nothing
+        is recorded until enable() is called, and until then stage() hands back one shared context that
+        does nothing, so the game runs at full speed.'''
+        self.enabled, self.target = False, None
+        self.stages = {} # Stage name -> [samples, total seconds, worst seconds, samples per bucket]
+        self.counters = collections.Counter()
+        self.idle = contextlib.nullcontext()
+
+########### NOTE: CLASS METHODS ###########
+
+    def enable(self, target="-"):
+        '''Starts recording, and writes a summary on exit to the file <target> as JSON (or to stderr as text when "-").'''
+        if not self.enabled:
+            atexit.register(self.dump)
+        self.enabled, self.target = True, target
+
+    def stage(self, name):
+        '''Returns a context that records the time taken by the code run inside it as one sample of the stage <name>.'''
+        return self.timed(name) if self.enabled else self.idle
+
+    @contextlib.contextmanager
+    def timed(self, name):
+        '''Context that records the time taken by the code run inside it as one sample of the stage <name>.'''
+        startTime = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - startTime)
+
+    def start(self):
+        '''Returns the time to pass to stop() once a stage is done, for stages that don't fit in a with block.'''
+        return time.perf_counter() if self.enabled else None
+
+    def stop(self, name, startTime):
+        '''Records the time since <startTime> (from start()) as one sample of the stage <name>.'''
+        if self.enabled and startTime is not None:
+            self.record(name, time.perf_counter() - startTime)
+
+    def record(self, name, seconds):
+        '''Adds a sample of <seconds> to the stage <name>.'''
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = [0, 0.0, 0.0, [0] * (len(PROFILE_BUCKETS) + 1)]
+        stats[0] += 1
+        stats[1] += seconds
+        stats[2] = max(stats[2], seconds)
+        stats[3][bisect.bisect_left(PROFILE_BUCKETS, seconds)] += 1
+
+    def count(self, name, amount=1):
+        '''Adds <amount> to the counter <name>.'''
+        if self.enabled:
+            self.counters[name] += amount
+
+    def summary(self):
+        '''Returns everything recorded as a dict that can be saved as JSON.'''
+        labels = [f"<={bound * 1000:g}ms" for bound in PROFILE_BUCKETS] + [f">{PROFILE_BUCKETS[-1] * 1000:g}ms"]
+        stages = {}
+        for name, (samples, total, worst, buckets) in sorted(self.stages.items()):
+            stages[name] = {"count": samples, "total": total, "mean": total / samples, "max": worst,
+                            "buckets": {label: n for label, n in zip(labels, buckets) if n}}
+        return {"stages": stages, "counters": dict(sorted(self.counters.items()))}
+
+    def dump(self):
+        '''Writes the summary to the target given to enable().'''
+        summary = self.summary()
+        if self.target != "-":
+            with open(self.target, "w") as f:
+                json.dump(summary, f, indent=1)
+            return
+
+        lines = ["", "="*36, "PROFILE", f"{'stage':<22}{'count':>8}{'total s':>11}{'mean ms':>11}{'max ms':>11}"]
+        for name, stats in summary["stages"].items():
+            lines.append(f"{name:<22}{stats['count']:>8}{stats['total']:>11.3f}{stats['mean'] * 1000:>11.3f}{stats['max'] * 1000:>11.3f}")
+            lines.append("    " + "  ".join(f"{label}: {n}" for label, n in stats["buckets"].items()))
+        lines.extend(f"{name}: {n}" for name, n in summary["counters"].items())
+        sys.stderr.write("\n".join(lines) + "\n")
+
+########### NOTE: PROFILER CLASS DEFINITION END ###########
+
+########### NOTE: CACHE CLASS DEFINITION START ###########
+
+class MazeCache:
+
+    # NOTE: class init declaration
+    def __init__(self, cache_dir, limit):
+        '''Create a cache of parsed mazes in the directory <cache_dir> (made when first needed), holding up to
+        about <limit> bytes. Each maze read from a text file is kept there packed, as a .mzb file named by its
+        MD5 digest, next to a .json file of its details, checksum and anything worked out from it (solutions,
+        analysis...). A record of each text file's size and modification time points to its digest, so an
+        unchanged file is opened from the cache without reading or hashing it. <cache_dir> "0" turns it off.'''
+        self.enabled = cache_dir not in ("", "0")
+        self.cache_dir, self.limit = cache_dir, limit
+        self.sources_dir = os.path.join(cache_dir, "sources")
+
+########### NOTE: CLASS METHODS ###########
+
+    def entryPath(self, digest, ext):
+        '''Returns the path of the cached file with the extension <ext> (.mzb or .json) for the maze <digest>.'''
+        return os.path.join(self.cache_dir, digest + ext)
+
+    def sourcePath(self, file_name):
+        '''Returns the path of the record of the maze file <file_name>, named by a hash of its full path.'''
+        return os.path.join(self.sources_dir, hashlib.md5(os.path.abspath(file_name).encode()).hexdigest() + ".json")
+
+    def writeJSON(self, path, data):
+        '''Writes <data> as JSON to <path> through a temporary file, so it's never seen half written.'''
+        with replacedAtomically(path) as temp, open(temp, "w") as f:
+            json.dump(data, f)
+
+    def lookup(self, file_name, stat):
+        '''Returns [grid, start, end] for the maze file <file_name> from the cache if its size and modification
+        time (from os.stat, given as <stat>) are the same as when it was cached, else None.'''
+        if not self.enabled:
+            return None
+        try:
+            with open(self.sourcePath(file_name)) as f:
+                source = json.load(f)
+        except (OSError, ValueError):
+            profiler.count("cache misses")
+            return None
+        if [source.get("size"), source.get("mtime")] != [stat.st_size, stat.st_mtime_ns]:
+            profiler.count("cache misses")
+            return None
+        return self.load(source.get("digest"))
+
+    def load(self, digest):
+        '''Returns [grid, start, end] for the maze <digest> from the cache, or None if it isn't cached. The
+        packed maze is checked against its details first (digest, size, start, end and CRC-32 checksum), and
+        an entry that fails the checks is removed so the maze is read from its file again.'''
+        if not isinstance(digest, str) or not re.fullmatch("[0-9a-f]{32}", digest):
+            return None
+        try:
+            with open(self.entryPath(digest, ".json")) as f:
+                meta = json.load(f)
+            with open(self.entryPath(digest, ".mzb"), 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                size, crc = len(data), zlib.crc32(data)
+            grid, start, end, verified = readMZBFile(self.entryPath(digest, ".mzb"))
+        except FileNotFoundError:
+            profiler.count("cache misses")
+            return None
+        except (OSError, ValueError): # Corrupt or half removed, read the maze from its file instead
+            grid, meta = None, {}
+
+        if grid is None or [size, crc, grid.md5Digest(), start, end, verified] != [meta.get("bytes"), meta.get("crc32"), digest,
+                                                                                    meta.get("start"), meta.get("end"), True]:
+            if grid is not None:
+                grid.close()
+            self.remove(digest)
+            profiler.count("cache entries failed")
+            return None
+        with contextlib.suppress(OSError):
+            os.utime(self.entryPath(digest, ".json")) # Most recently used
+        profiler.count("cache hits")
+        return [grid, start, end]
+
+    def store(self, file_name, stat, grid, start, end):
+        '''Adds the maze [grid, start, end], read from the file <file_name> and validated, to the cache along
+        with a record of the file's size and modification time (from os.stat before it was read, given as
+        <stat>). Returns the maze's digest, or None if the cache is off or can't be written.'''
+        if not self.enabled:
+            return None
+        digest = grid.md5Digest()
+        try:
+            os.makedirs(self.sources_dir, exist_ok=True)
+            if not os.path.exists(self.entryPath(digest, ".json")): # The same maze may already be cached from another file
+                with replacedAtomically(self.entryPath(digest, ".mzb")) as temp:
+                    writeMZBFile(grid, temp, verified=True)
+                    with open(temp, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                        size, crc = len(data), zlib.crc32(data)
+                self.writeJSON(self.entryPath(digest, ".json"), {"rows": grid.rows, "cols": grid.cols, "start": start, "end": end,
+                                                                 "bytes": size, "crc32": crc, "derived": {}})
+            self.writeJSON(self.sourcePath(file_name), {"file": os.path.abspath(file_name), "size": stat.st_size,
+                                                        "mtime": stat.st_mtime_ns, "digest": digest})
+            self.evict()
+        except OSError:
+            return None
+        profiler.count("cache stores")
+        return digest
+
+    def derived(self, digest, name, compute):
+        '''Returns the value called <name> worked out from the maze <digest>, saved with the maze in the cache.
+        If it hasn't been saved yet (or the maze isn't cached), <compute>() works it out, and the value (a
+        dict that can be saved as JSON) is saved for next time.'''
+        if not self.enabled:
+            return compute()
+        path = self.entryPath(digest, ".json")
+        try:
+            with open(path) as f:
+                meta = json.load(f)
+            if name in meta["derived"]:
+                return meta["derived"][name]
+        except (OSError, ValueError, KeyError, TypeError):
+            return compute()
+
+        meta["derived"][name] = compute()
+        with contextlib.suppress(OSError):
+            self.writeJSON(path, meta)
+        return meta["derived"][name]
+
+    def remove(self, digest):
+        '''Removes the maze <digest> from the cache. Records of files pointing to it are left to fail on use.'''
+        for ext in (".json", ".mzb"):
+            with contextlib.suppress(OSError):
+                os.remove(self.entryPath(digest, ext))
+
+    def evict(self):
+        '''Removes the least recently used mazes (by the modification time of their .json files, updated on
+        every use) until the cache holds at most self.limit bytes, along with the records of files pointing to them.'''
+        entries, total = [], 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                used = os.stat(os.path.join(self.cache_dir, name)).st_mtime_ns
+                size = sum(os.path.getsize(self.entryPath(name[:-5], ext)) for ext in (".json", ".mzb"))
+            except OSError: # Removed by another process
+                continue
+            entries.append([used, name[:-5], size])
+            total += size
+        if total <= self.limit:
+            return
+
+        removed = set()
+        for used, digest, size in sorted(entries):
+            if total <= self.limit:
+                break
+            self.remove(digest)
+            removed.add(digest)
+            total -= size
+        for name in os.listdir(self.sources_dir):
+            path = os.path.join(self.sources_dir, name)
+            try:
+                with open(path) as f:
+                    if json.load(f).get("digest") in removed:
+                        os.remove(path)
+            except (OSError, ValueError, AttributeError):
+                continue
+
+########### NOTE: CACHE CLASS DEFINITION END ###########
+
 ########### NOTE: LEADERBOARD & PLAYER CLASS DEFINITION START ###########
 
 class Leaderboard:
     def __init__(self, l_filename):
-        '''Creates a leaderboard object from the text file with the filename specified in <l_filename>'''
-        self.boards = []
-        self.l_filename = l_filename
+        '''Creates a leaderboard object from the text file with the filename specified in <l_filename>,
+        plus any wins recorded in its journal (<l_filename>.journal) since the file was last rewritten'''
+        self.boards = {}
+        self.l_filename, self.j_filename = l_filename, l_filename + ".journal"
+        self.lock = threading.Lock() # Held while boards are changed or written out
+        self.journalled = 0 # Wins appended to the journal since the last rewrite
+        self.generation = 0 # Times the file has been rewritten, saved in it as a first "@generation" chunk
         try:
             with open(l_filename, 'r') as f:
                 raw = f.read().split("\n;\n") # Get raw data
-            
+
             # Parse raw data into proper objects (Basically splitting lots of delimiters)
-            if len(raw) >= 1:
-                boards = []
-                for chunk in raw:
-                    data = chunk.strip().split("\n")
-                    digest_id = data[0]
-                    players = []
-                    for line in data[1:]:
-                        playerID, score = line.split("|")
-                        players.append(Player(playerID, score))
-                    boards.append(Board(digest_id, players))
-
-                self.boards = boards
+            for chunk in raw:
+                data = chunk.strip().split("\n")
+                if data[0] == "":
+                    continue
+                if data[0].startswith("@"): # Board ids are hex digests, so this is the generation
+                    self.generation = int(data[0][1:]) if data[0][1:].isdigit() else self.generation
+                    continue
+                players = []
+                for line in data[1:]:
+                    players.append(Player(*line.split("|"))) # playerID|score, plus |moves for newer entries
+                self.boards[data[0]] = Board(data[0], players)
 
         # Make new file if no leaderboard file found
         except FileNotFoundError:
             with open(l_filename, 'w') as f:
                 f.write("")
 
+        # Replay wins from the journal. It starts with the generation of the file it adds to, so a journal
+        # left by a crash after a rewrite (but before the journal was emptied) is older and skipped whole.
+        # Journals without one were written before generations, for a file that had none either (0).
+        generation = 0
+        try:
+            with open(self.j_filename, 'r') as f:
+                for line in f:
+                    line = line.rstrip("\n")
+                    if line.startswith("@"):
+                        generation = int(line[1:]) if line[1:].isdigit() else -1 # A damaged header matches no file
+                        continue
+                    fields = line.split("|")
+                    if len(fields) in (3, 4) and generation == self.generation:
+                        self.getBoard(fields[0]).addPlayer(Player(*fields[1:]))
+                        self.journalled += 1
+        except FileNotFoundError:
+            generation = -1
+        if generation != self.generation: # Wins are journalled for the current file from now on
+            self.startJournal()
+
+        atexit.register(self.compact) # Fold the journal back into the leaderboard file on exit
+
     def getBoard(self, digest_id):
         '''Returns the Board object in the caller Leaderboard with the id <digest_id>'''
-        for board in self.boards:
-            if board.digest_id == digest_id:
-                return board
-        
-        # No matches so make new Board, append to Leaderboard and return it instead
-        newBoard = Board(digest_id, [])
-        self.boards.append(newBoard)
-        return newBoard
+        board = self.boards.get(digest_id)
+
+        # No matches so make new Board, add it to Leaderboard and return it instead
+        if board is None:
+            board = self.boards[digest_id] = Board(digest_id, [])
+        return board
+
+    def getAllBoards(self):
+        '''Returns a list of every Board object in the caller Leaderboard.'''
+        return list(self.boards.values())
+
+    def recordWin(self, board, player):
+        '''Adds the Player object <player> to the Board object <board> in the caller, and saves the win
+        by appending one line to the journal, so the cost doesn't grow with the leaderboard.'''
+        self.recordWins([(board.digest_id, player)])
+
+    def recordWins(self, wins):
+        '''Adds every win in <wins>, a list of (board id, Player object), to the boards in the caller, and
+        saves the ranked ones by appending them to the journal in a single write.'''
+        with self.lock:
+            lines = []
+            for digest_id, player in wins:
+                if self.getBoard(digest_id).addPlayer(player) >= 0:
+                    lines.append(f"{digest_id}|{player.playerID}|{player.score}|{player.moves}\n")
+            if not lines:
+                return
+            with open(self.j_filename, 'a') as f:
+                f.write("".join(lines))
+            profiler.count("bytes written", sum(len(line) for line in lines))
+            self.journalled += len(lines)
+
+        # Rewrite the leaderboard file in the background once the journal gets long
+        if self.journalled >= JOURNAL_LIMIT:
+            threading.Thread(target=self.compact, daemon=True).start()
+
+    def compact(self):
+        '''Rewrites the leaderboard file with the current data and empties the journal, if any wins
+        have been journalled since the last rewrite.'''
+        with self.lock:
+            if self.journalled > 0:
+                with profiler.stage("leaderboard.rewrite"):
+                    self.updateLeaderboard()
 
     def updateLeaderboard(self):
-        '''Updates the Leaderboard's storage file with the most current Leaderboard data'''
+        '''Updates the Leaderboard's storage file with the most current Leaderboard data, then
+        empties the journal. The new file is written to a temporary file first and then swapped in,
+        so a crash never leaves a half-written leaderboard.'''
         load = []
 
         # basically the reverse of Leaderboard init
-        for board in self.boards:
+        for board in self.boards.values():
             board_load = [board.digest_id]
             for p in board.players:
-                board_load.append(f"{p.playerID}|{str(p.score)}")
+                board_load.append(f"{p.playerID}|{str(p.score)}" + (f"|{p.moves}" if p.moves else ""))
             load.append("\n".join(board_load))
 
-        with open(self.l_filename, 'w') as f:
-            f.write("\n;\n".join(load))
-            f.truncate()
+        text = "\n;\n".join([f"@{self.generation + 1}"] + load)
+        with open(self.l_filename + ".tmp", 'w') as f:
+            f.write(text)
+        profiler.count("bytes written", len(text))
+        os.replace(self.l_filename + ".tmp", self.l_filename)
+        self.generation += 1
+
+        # Journalled wins are now in the leaderboard file
+        self.startJournal()
+        self.journalled = 0
+
+    def startJournal(self):
+        '''Empties the journal, leaving just the generation of the leaderboard file it adds wins to.'''
+        with open(self.j_filename, 'w') as f:
+            f.write(f"@{self.generation}\n")
+
+class SQLiteLeaderboard:
+    def __init__(self, db_filename):
+        '''Creates a leaderboard object stored in the SQLite database with the filename specified in
+        <db_filename>. Works like a Leaderboard object, but boards are read from the database when
+        they are fetched, and every win is its own transaction, so many games can share one database.'''
+        self.db_filename = db_filename
+        # Transactions are explicit, and the game server writes from its own thread (one at a time)
+        self.db = sqlite3.connect(db_filename, timeout=30, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL") # Readers don't block the writer and vice versa
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS scores (id INTEGER PRIMARY KEY, digest_id TEXT NOT NULL, "
+                        "player TEXT NOT NULL, score REAL NOT NULL, moves TEXT NOT NULL DEFAULT '')")
+        if "moves" not in [column[1] for column in self.db.execute("PRAGMA table_info(scores)")]:
+            self.db.execute("ALTER TABLE scores ADD COLUMN moves TEXT NOT NULL DEFAULT ''") # Databases made before move logs
+        self.db.execute("CREATE INDEX IF NOT EXISTS scores_by_board ON scores (digest_id, score)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS imports (l_filename TEXT PRIMARY KEY)")
+
+    def getBoard(self, digest_id):
+        '''Returns a Board object with the current top players of the board with the id <digest_id>'''
+        rows = self.db.execute("SELECT player, score, moves FROM scores WHERE digest_id = ? ORDER BY score, id LIMIT ?",
+                               (digest_id, BOARD_SIZE))
+        return Board(digest_id, [Player(*row) for row in rows])
+
+    def getAllBoards(self):
+        '''Returns a list of every Board object in the database.'''
+        return [self.getBoard(digest_id) for (digest_id,) in self.db.execute("SELECT DISTINCT digest_id FROM scores").fetchall()]
+
+    def recordWin(self, board, player):
+        '''Adds the Player object <player> to the board with the id of the Board object <board>, and
+        removes anyone pushed off that board, in a single transaction. <board> is refreshed afterwards
+        with any wins from other games.'''
+        self.recordWins([(board.digest_id, player)])
+        fresh = self.getBoard(board.digest_id)
+        board.players, board.scores = fresh.players, fresh.scores
+
+    def recordWins(self, wins):
+        '''Adds every win in <wins>, a list of (board id, Player object), to the database and trims the
+        boards they were added to, all in a single transaction.'''
+        with self.transaction():
+            self.db.executemany("INSERT INTO scores (digest_id, player, score, moves) VALUES (?, ?, ?, ?)",
+                                [(digest_id, p.playerID, p.score, p.moves) for digest_id, p in wins])
+            for digest_id in {digest_id for digest_id, _ in wins}:
+                self.db.execute("DELETE FROM scores WHERE digest_id = ? AND id NOT IN "
+                                "(SELECT id FROM scores WHERE digest_id = ? ORDER BY score, id LIMIT ?)",
+                                (digest_id, digest_id, BOARD_SIZE))
+
+    def importFile(self, l_filename):
+        '''Copies every board from the leaderboard text file <l_filename> (and its journal) into the
+        database, unless that file has been imported before. Returns True if it was imported.'''
+        if not os.path.exists(l_filename):
+            return False
+        with self.transaction():
+            if self.db.execute("SELECT 1 FROM imports WHERE l_filename = ?", (l_filename,)).fetchone():
+                return False
+            for board in Leaderboard(l_filename).boards.values():
+                self.db.executemany("INSERT INTO scores (digest_id, player, score, moves) VALUES (?, ?, ?, ?)",
+                                    [(board.digest_id, p.playerID, p.score, p.moves) for p in board.players])
+            self.db.execute("INSERT INTO imports (l_filename) VALUES (?)", (l_filename,))
+        return True
+
+    def transaction(self):
+        '''Returns a context manager running its block as one write transaction on the database.'''
+        return SQLiteTransaction(self.db)
+
+    def compact(self):
+        '''Nothing to compact, wins are written to the database as they happen.'''
+
+    def updateLeaderboard(self):
+        '''Nothing to update, wins are written to the database as they happen.'''
+
+class SQLiteTransaction:
+    def __init__(self, db):
+        '''Creates a context manager for a write transaction on the sqlite3 connection <db>'''
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE") # Take the write lock up front, waiting for other games
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        self.db.execute("COMMIT" if exc_type is None else "ROLLBACK")
 
 class Board:
     def __init__(self, digest_id, players):
         '''Creates a Board object using a string representing the Board's id and a list of Player objects'''
         self.digest_id = digest_id
-        self.players = players
+        self.players = sorted(players, key=lambda p: p.score) # Kept sorted by score (fastest first)
+        self.scores = [p.score for p in self.players] # Scores of self.players, for bisecting
 
     def getRank(self, score):
         '''Gets the rank of a score within the context of the players already on the board.
         Returns -1 if the score doesn't beat anyone.'''
-        for i in range(len(self.players)):
-            if self.players[i].score > score:
-                return i
-        
-        # Didn't beat anyone
-        if len(self.players) < 10:
-            return len(self.players)
-        else:
-            return -1
+        rank = bisect.bisect_right(self.scores, score) # Ties go behind the players already there
+        return rank if rank < BOARD_SIZE else -1
+
+    def addPlayer(self, player):
+        '''Inserts the Player object <player> into the board at its rank, dropping anyone pushed
+        off the end of the board. Returns the rank, or -1 if the player wasn't ranked.'''
+        rank = self.getRank(player.score)
+        if rank >= 0:
+            self.players.insert(rank, player)
+            self.scores.insert(rank, player.score)
+            del self.players[BOARD_SIZE:], self.scores[BOARD_SIZE:]
+        return rank
 
 class Player:
-    def __init__(self, playerID, score):
-        '''Creates a new Player instance using a string representing the Player nickname and a float representing score'''
-        self.playerID, self.score = str(playerID), float(score)
+    def __init__(self, playerID, score, moves=""):
+        '''Creates a new Player instance using a string representing the Player nickname, a float representing score
+        and a string containing the move log of the run (see encodeMoveLog), which is empty for older entries'''
+        self.playerID, self.score, self.moves = str(playerID), float(score), moves
 
     def betterThanPlayer(self, Player):
         '''Comparison function based on score. Returns True if the other Player's score is higher than the callers'.'''
@@ -489,6 +1881,1155 @@ class Player:
 
 ########### NOTE: LEADERBOARD & PLAYER CLASS DEFINITION END ###########
 
+########### NOTE: SOLVER DEFINITION START ###########
+
+class Solution:
+    def __init__(self, method, path, expanded):
+        '''Creates a Solution object using the name of the solver used, the path found from start to end as
+        a list of [row, column] coords (empty if there is no path) and the number of nodes expanded'''
+        self.method, self.path, self.expanded = method, path, expanded
+        self.length = len(path) - 1 # Number of moves needed, -1 if the maze can't be solved
+
+    def isSolvable(self):
+        '''Checks if a path from start to end was found.'''
+        return self.length >= 0
+
+class SparseArray(dict):
+    def __init__(self, fill):
+        '''Creates a SparseArray object that stands in for an array over every cell of a tiled maze, only
+        storing the cells that are set. Cells that were never set read as <fill>.'''
+        self.fill = fill
+
+    def __missing__(self, i):
+        return self.fill
+
+def cellArray(grid, fill, typecode='i'):
+    '''Returns an array with one item per cell of <grid>, all set to <fill>, for searches to keep their
+    state in. Tiled grids get a SparseArray, so a search only uses memory for the cells it reaches.'''
+    if isinstance(grid, TiledGrid):
+        return SparseArray(fill)
+    return array(typecode, [fill]) * len(grid.cells)
+
+def tracePath(parent, root, i, cols):
+    '''Follows the flat index array <parent> back from index <i> to index <root>, and returns the path
+    from <root> to <i> as a list of [row, column] coords. Returns an empty list if <i> was never reached.'''
+    if parent[i] == -1:
+        return []
+    path = [i]
+    while i != root:
+        i = parent[i]
+        path.append(i)
+    return [list(divmod(i, cols)) for i in reversed(path)]
+
+def solveBFS(grid, start, end):
+    '''Finds the shortest path from <start> to <end> in a Grid with a breadth first search.'''
+    cells, cols, size = grid.cells, grid.cols, len(grid.cells)
+    src, dst = start[0]*cols + start[1], end[0]*cols + end[1]
+    parent = cellArray(grid, -1) # parent[i] is the index that cell i was reached from
+    parent[src] = src
+
+    # Search level by level, so each frontier is a plain list of flat indices
+    frontier, expanded = [src], 0
+    while frontier and parent[dst] == -1:
+        nextFrontier = []
+        for i in frontier:
+            expanded += 1
+            c = i % cols
+            for j in (i-cols, i+cols, i-1 if c > 0 else -1, i+1 if c < cols-1 else -1):
+                if 0 <= j < size and parent[j] == -1 and cells[j] != WALL:
+                    parent[j] = i
+                    nextFrontier.append(j)
+        frontier = nextFrontier
+
+    return Solution("bfs", tracePath(parent, src, dst, cols), expanded)
+
+def solveAStar(grid, start, end):
+    '''Finds the shortest path from <start> to <end> in a Grid with an A* search, using the Manhattan
+    distance to <end> as the heuristic.'''
+    cells, cols, size = grid.cells, grid.cols, len(grid.cells)
+    src, dst = start[0]*cols + start[1], end[0]*cols + end[1]
+    parent, dist = cellArray(grid, -1), cellArray(grid, -1)
+    closed = cellArray(grid, 0, 'b')
+    parent[src], dist[src] = src, 0
+
+    # Heap entries are (estimated total, -moves so far, index), so ties go to the deeper node
+    heap, expanded = [(abs(end[0]-start[0]) + abs(end[1]-start[1]), 0, src)], 0
+    while heap:
+        i = heapq.heappop(heap)[2]
+        if closed[i]:
+            continue
+        closed[i] = 1
+        expanded += 1
+        if i == dst:
+            break
+
+        d = dist[i] + 1 # moves to reach the neighbours of i
+        r, c = divmod(i, cols)
+        for j in (i-cols, i+cols, i-1 if c > 0 else -1, i+1 if c < cols-1 else -1):
+            if 0 <= j < size and not closed[j] and cells[j] != WALL and (dist[j] == -1 or d < dist[j]):
+                parent[j], dist[j] = i, d
+                jr, jc = divmod(j, cols)
+                heapq.heappush(heap, (d + abs(end[0]-jr) + abs(end[1]-jc), -d, j))
+
+    return Solution("astar", tracePath(parent, src, dst, cols), expanded)
+
+def solveBidirectional(grid, start, end):
+    '''Finds the shortest path from <start> to <end> in a Grid with a breadth first search from both
+    ends at once, always growing the smaller of the two frontiers.'''
+    cells, cols, size = grid.cells, grid.cols, len(grid.cells)
+    src, dst = start[0]*cols + start[1], end[0]*cols + end[1]
+    parents = [cellArray(grid, -1), cellArray(grid, -1)] # [from start, from end]
+    parents[0][src], parents[1][dst] = src, dst
+    frontiers, expanded, meet = [[src], [dst]], 0, src if src == dst else -1
+
+    while meet == -1 and frontiers[0] and frontiers[1]:
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        mine, other = parents[side], parents[1-side]
+        nextFrontier = []
+        for i in frontiers[side]:
+            expanded += 1
+            c = i % cols
+            for j in (i-cols, i+cols, i-1 if c > 0 else -1, i+1 if c < cols-1 else -1):
+                if 0 <= j < size and mine[j] == -1 and cells[j] != WALL:
+                    mine[j] = i
+                    if other[j] != -1: # Both searches have reached j
+                        meet = j
+                        break
+                    nextFrontier.append(j)
+            if meet != -1:
+                break
+        frontiers[side] = nextFrontier
+
+    path = []
+    if meet != -1:
+        path = tracePath(parents[0], src, meet, cols) + tracePath(parents[1], dst, meet, cols)[::-1][1:]
+    return Solution("bidirectional", path, expanded)
+
+def canReach(grid, start, end):
+    '''Checks if <end> can be reached from <start> in a Grid, with the same search from both ends as
+    solveBidirectional but without finding the path. Only one byte per cell is kept (which side reached
+    it, if any), instead of a parent index per cell from each side, so validating a maze stays small.
+    Tiled grids only keep the cells reached (see cellArray).'''
+    cells, cols, size = grid.cells, grid.cols, len(grid.cells)
+    src, dst = start[0]*cols + start[1], end[0]*cols + end[1]
+    if src == dst:
+        return True
+    seen = cellArray(grid, 0, 'b') # 1 once reached from the start, 2 once reached from the end
+    seen[src], seen[dst] = 1, 2
+    frontiers = [[src], [dst]]
+    while frontiers[0] and frontiers[1]:
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        mark, nextFrontier = side + 1, []
+        for i in frontiers[side]:
+            c = i % cols
+            for j in (i-cols, i+cols, i-1 if c > 0 else -1, i+1 if c < cols-1 else -1):
+                if 0 <= j < size and seen[j] != mark and cells[j] != WALL:
+                    if seen[j]: # Reached from the other side
+                        return True
+                    seen[j] = mark
+                    nextFrontier.append(j)
+        frontiers[side] = nextFrontier
+    return False
+
+class DistanceField:
+    def __init__(self, grid, end):
+        '''Creates a DistanceField object holding the fewest moves from every cell of the Grid <grid> to the
+        coords <end> (None for a maze without an end), found with one breadth first search from <end>.
+        Walls and cells that can't reach <end> hold -1. After a cell of <grid> is changed, update() repairs
+        the distances around it instead of searching the whole grid again.'''
+        self.grid, self.end = grid, end
+        self.dist = cellArray(grid, -1) # Moves to the end for every cell, row by row
+        self.repaired = 0 # Cells looked at by the last update()
+        if end is not None and grid.cells[end[0]*grid.cols + end[1]] != WALL:
+            dst = end[0]*grid.cols + end[1]
+            self.dist[dst] = 0
+            self.spread([dst])
+
+    def neighbours(self, i):
+        '''Returns the flat indices of the cells next to the cell at flat index <i>.'''
+        cols, c = self.grid.cols, i % self.grid.cols
+        return [j for j in (i-cols, i+cols, i-1 if c > 0 else -1, i+1 if c < cols-1 else -1) if 0 <= j < len(self.grid.cells)]
+
+    def spread(self, frontier):
+        '''Searches out from the cells in <frontier> (all the same distance from the end), lowering the
+        distance of every cell that can be reached in fewer moves through them.'''
+        cells, dist = self.grid.cells, self.dist
+        while frontier:
+            nextFrontier = []
+            for i in frontier:
+                d = dist[i] + 1
+                for j in self.neighbours(i):
+                    if cells[j] != WALL and (dist[j] == -1 or d < dist[j]):
+                        dist[j] = d
+                        nextFrontier.append(j)
+            self.repaired += len(frontier)
+            frontier = nextFrontier
+
+    def get(self, r, c):
+        '''Returns the fewest moves from row <r>, column <c> to the end, or -1 if it can't be reached.'''
+        return self.dist[r*self.grid.cols + c]
+
+    def update(self, r, c):
+        '''Repairs the distances after the cell at row <r>, column <c> of the grid was changed. Opening a
+        cell can only shorten distances, so they are spread out from it. Walling a cell off can only
+        lengthen the distances of the cells whose every shortest route went through it, so only those
+        are found and searched again, from the cells around them.'''
+        cells, dist, i = self.grid.cells, self.dist, r*self.grid.cols + c
+        self.repaired = 0
+        if self.end is None:
+            return
+        if cells[i] != WALL:
+            if dist[i] == -1:
+                closest = [dist[j] for j in self.neighbours(i) if dist[j] != -1]
+                if closest:
+                    dist[i] = min(closest) + 1
+                    self.spread([i])
+            return
+        if dist[i] == -1:
+            return
+
+        # Find the cells that lost their route, level by level: a cell is lost once every neighbour
+        # one move closer to the end is lost (or is the new wall)
+        lost, frontier = {i}, [i]
+        while frontier:
+            nextFrontier = []
+            for u in frontier:
+                d = dist[u] + 1
+                for j in self.neighbours(u):
+                    if j not in lost and dist[j] == d and not any(
+                            dist[k] == d - 1 and k not in lost and cells[k] != WALL for k in self.neighbours(j)):
+                        lost.add(j)
+                        nextFrontier.append(j)
+            frontier = nextFrontier
+        for u in lost:
+            dist[u] = -1
+
+        # Search the lost cells again from the cells around them that kept their route
+        heap = []
+        for u in lost:
+            closest = [dist[k] for k in self.neighbours(u) if dist[k] != -1]
+            if closest and cells[u] != WALL:
+                heap.append((min(closest) + 1, u))
+        heapq.heapify(heap)
+        while heap:
+            d, u = heapq.heappop(heap)
+            if dist[u] != -1 and dist[u] <= d:
+                continue
+            dist[u] = d
+            for j in self.neighbours(u):
+                if cells[j] != WALL and (dist[j] == -1 or d + 1 < dist[j]):
+                    heapq.heappush(heap, (d + 1, j))
+        self.repaired = len(lost)
+
+def openDirections(grid):
+    '''Returns which neighbours of every cell of the Grid <grid> are open (not walls) as bytes, row by row:
+    bit 0 set if the cell above is open, then bits 1, 2 and 3 for the cells right, below and left of it (the
+    order of TURNS), and 255 for the walls themselves. Rather than looping over cells, the open cells are read
+    as one big integer with a byte per cell, which is shifted up, down, left and right by whole rows or cells,
+    so every cell is worked out at once (each direction has its own bit, so nothing carries between cells).'''
+    rows, cols, n = grid.rows, grid.cols, grid.rows * grid.cols
+    codes = grid.cells if isinstance(grid.cells, (bytes, bytearray)) else grid.cells.unpack(0, n)
+    opened = int.from_bytes(bytes(codes).translate(CELLS_TO_OPEN), "big") # First cell in the highest byte
+    ones, full = int.from_bytes(b"\x01" * n, "big"), (1 << 8*n) - 1
+    notFirst = int.from_bytes((b"\x00" + b"\x01" * (cols - 1)) * rows, "big") # Cells with a neighbour on their left
+    notLast = int.from_bytes((b"\x01" * (cols - 1) + b"\x00") * rows, "big") # Cells with a neighbour on their right
+    dirs = ((opened >> 8*cols) | ((opened << 8) & notLast) << 1
+            | ((opened << 8*cols) & full) << 2 | ((opened >> 8) & notFirst) << 3)
+    dirs |= (opened ^ ones) * 0xFF # Walls
+    return dirs.to_bytes(n, "big")
+
+class JunctionGraph:
+    def __init__(self, grid, start, end):
+        '''Creates a JunctionGraph object: an index of the Grid <grid> as a graph of its nodes (junctions, dead
+        ends, cells walled in on every side and the <start> and <end> coords) joined by the corridors between
+        them, weighted by their length. Corridor cells (2 open neighbours) aren't stored, and are walked along
+        when needed. Holds the fewest moves to <end> from every node, found with one search of the graph.'''
+        self.grid, self.start, self.end = grid, start, end
+        self.dirs = openDirections(grid) # Open neighbours of every cell as bits (see openDirections), 255 for walls
+        self.offsets = [-grid.cols, 1, grid.cols, -1] # Flat index change of a move in each direction
+        self.isNode = bytearray(self.dirs.translate(NODE_CELLS)) # 1 for every node cell, row by row
+        for r, c in [start, end]:
+            self.isNode[r*grid.cols + c] = self.dirs[r*grid.cols + c] != 255
+
+        # Node cells in order, so a node's id is found by bisecting for its cell
+        self.nodes, i = array('i'), self.isNode.find(1)
+        while i >= 0:
+            self.nodes.append(i)
+            i = self.isNode.find(1, i + 1)
+
+        # The corridor leaving node u in direction d leads to node targets[4*u + d] (-1 for none) in lengths[4*u + d]
+        # moves. Each corridor is walked once, and filled in at both of its ends.
+        self.targets, self.lengths = array('i', [-1]) * (4 * len(self.nodes)), array('i', [0]) * (4 * len(self.nodes))
+        targets, lengths, dirs = self.targets, self.lengths, self.dirs
+        for u, i in enumerate(self.nodes):
+            for d in range(4):
+                if dirs[i] >> d & 1 and targets[4*u + d] == -1:
+                    v, length, last = self.walk(i, d)
+                    targets[4*u + d], lengths[4*u + d] = v, length
+                    targets[4*v + (last ^ 2)], lengths[4*v + (last ^ 2)] = u, length
+
+        # Fewest moves to the end from every node (Dijkstra's algorithm, as corridors have different lengths)
+        self.dist, self.expanded = array('i', [-1]) * len(self.nodes), 0
+        if self.isNode[end[0]*grid.cols + end[1]]:
+            dist, dst = self.dist, self.nodeId(end[0]*grid.cols + end[1])
+            dist[dst], heap = 0, [(0, dst)]
+            while heap:
+                d, u = heapq.heappop(heap)
+                if d > dist[u]:
+                    continue
+                self.expanded += 1
+                for e in range(4*u, 4*u + 4):
+                    v = targets[e]
+                    if v >= 0 and (dist[v] == -1 or d + lengths[e] < dist[v]):
+                        dist[v] = d + lengths[e]
+                        heapq.heappush(heap, (dist[v], v))
+
+########### NOTE: CLASS METHODS ###########
+    def nodeId(self, i):
+        '''Returns the id of the node at flat index <i>.'''
+        return bisect.bisect_left(self.nodes, i)
+
+    def walk(self, i, d, cells=None):
+        '''Follows the corridor leaving flat index <i> in direction <d> (an index into TURNS) until it reaches
+        a node. Returns [node id, moves taken, direction of the last move], or None if the corridor loops back
+        round to <i> first. The flat index of every cell passed (ending with the node) is appended to the list
+        <cells>, if given.'''
+        dirs, isNode, offsets = self.dirs, self.isNode, self.offsets
+        j, length = i + offsets[d], 1
+        while not isNode[j]:
+            if cells is not None:
+                cells.append(j)
+            if j == i:
+                return None
+            d = LOWEST_DIRECTION[dirs[j] ^ (1 << (d ^ 2))] # A corridor only has one way on besides the way back
+            j, length = j + offsets[d], length + 1
+        if cells is not None:
+            cells.append(j)
+        return [self.nodeId(j), length, d]
+
+    def routes(self, i):
+        '''Returns [moves to the end, direction of the first move] for each way out of the open cell at flat
+        index <i> that can reach the end.'''
+        if self.isNode[i]:
+            u = self.nodeId(i)
+            ways = [(self.targets[4*u + d], self.lengths[4*u + d], d) for d in range(4) if self.targets[4*u + d] >= 0]
+        else:
+            ways = []
+            for d in range(4):
+                found = self.walk(i, d) if self.dirs[i] >> d & 1 else None
+                if found is not None:
+                    ways.append((found[0], found[1], d))
+        return [[length + self.dist[v], d] for v, length, d in ways if self.dist[v] >= 0]
+
+    def get(self, r, c):
+        '''Returns the fewest moves from row <r>, column <c> to the end, or -1 if it can't be reached.'''
+        i = r*self.grid.cols + c
+        if self.dirs[i] == 255:
+            return -1
+        if self.isNode[i]:
+            return self.dist[self.nodeId(i)]
+        return min([moves for moves, _ in self.routes(i)], default=-1)
+
+    def hint(self, pos):
+        '''Returns the key (W/A/S/D) of a move from the coords <pos> that gets one move closer to the end,
+        or None if there is none.'''
+        i = pos[0]*self.grid.cols + pos[1]
+        if list(pos) == list(self.end) or self.dirs[i] == 255 or not self.routes(i):
+            return None
+        return TURNS[min(self.routes(i))[1]]
+
+    def solve(self):
+        '''Returns the shortest path from the start to the end as a Solution, following the fewest moves
+        to the end from node to node and walking the corridors in between.'''
+        cols, i, end = self.grid.cols, self.start[0]*self.grid.cols + self.start[1], self.end[0]*self.grid.cols + self.end[1]
+        if self.dirs[i] == 255 or self.dist[self.nodeId(i)] < 0:
+            return Solution("junction", [], self.expanded)
+        path = [i]
+        while i != end:
+            u = self.nodeId(i)
+            d = next(d for d in range(4) if self.targets[4*u + d] >= 0
+                     and self.dist[self.targets[4*u + d]] == self.dist[u] - self.lengths[4*u + d])
+            self.walk(i, d, path)
+            i = path[-1]
+        return Solution("junction", [[i // cols, i % cols] for i in path], self.expanded)
+
+    def analysis(self):
+        '''Returns the shape of the maze as a dict: how many cells are open, nodes, junctions, dead ends and
+        corridors, the average number of ways out of a junction, and how many corridors there are of each
+        length (grouped by powers of 2).'''
+        degrees = self.dirs.translate(OPEN_NEIGHBOURS)
+        open_cells, junctions = len(degrees) - degrees.count(255), degrees.count(3) + degrees.count(4)
+        buckets = collections.Counter()
+        for length in self.lengths:
+            if length:
+                buckets[1 << (length.bit_length() - 1)] += 1 # Every corridor is counted from both of its ends
+        corridors = sum(buckets.values()) // 2
+        return {"open_cells": open_cells, "nodes": len(self.nodes), "junctions": junctions, "dead_ends": degrees.count(1),
+                "corridors": corridors, "corridor_cells": open_cells - len(self.nodes),
+                "branching_factor": round((3*degrees.count(3) + 4*degrees.count(4)) / junctions, 3) if junctions else 0.0,
+                "mean_corridor": round(sum(self.lengths) / (2 * corridors), 2) if corridors else 0.0,
+                "corridor_lengths": {(f"{low}-{2*low - 1}" if low > 1 else "1"): buckets[low] // 2 for low in sorted(buckets)},
+                "compression": round(open_cells / len(self.nodes), 2) if self.nodes else 0.0}
+
+def solveJunctions(grid, start, end):
+    '''Finds the shortest path from <start> to <end> in a Grid by building its JunctionGraph, then searching
+    between junctions instead of between cells. Raises ValueError for a TiledGrid, as building the graph
+    unpacks every cell (see Maze.getJunctionGraph).'''
+    if isinstance(grid, TiledGrid):
+        raise ValueError("Maze is too big to solve with the junction graph!")
+    return JunctionGraph(grid, start, end).solve()
+
+SOLVERS = {"bfs": solveBFS, "astar": solveAStar, "bidirectional": solveBidirectional, "junction": solveJunctions}
+
+def solve(maze, method="bfs"):
+    '''Solves the Maze object passed into <maze> with the solver named <method> ("bfs", "astar",
+    "bidirectional" or "junction") and returns a Solution. Usable from scripts as well as from the game.'''
+    if method not in SOLVERS:
+        raise ValueError(f"Unknown solver {method!r}, expected one of: {', '.join(SOLVERS)}")
+    return SOLVERS[method](maze.maze, maze.start, maze.end)
+
+########### NOTE: SOLVER DEFINITION END ###########
+
+########### NOTE: GENERATOR DEFINITION START ###########
+
+# Generated mazes are perfect mazes (exactly one path between any two passages). Every cell with an
+# even row and even column is a room, and the cells between two rooms are either walls or passages.
+# When a dimension is even, its last row/column holds dead ends hanging off the rooms next to it.
+
+def makeWalledGrid(rows, cols):
+    '''Returns a Grid of <rows> by <cols> with every room opened up and every other cell a wall.'''
+    grid = Grid(rows, cols, bytearray([WALL]) * (rows * cols))
+    for r in range(0, rows, 2):
+        grid.cells[r*cols:(r+1)*cols:2] = bytes((cols + 1) // 2)
+    return grid
+
+def openEvenEdges(grid):
+    '''Opens the dead ends in the last row/column of a Grid with an even number of rows/columns.'''
+    rows, cols = grid.rows, grid.cols
+    if rows % 2 == 0:
+        grid.cells[(rows-1)*cols:rows*cols:2] = bytes((cols + 1) // 2)
+    if cols % 2 == 0:
+        grid.cells[cols-1::2*cols] = bytes((rows + 1) // 2)
+
+def placeEnds(grid):
+    '''Places the start on the first passage and the end on the last passage of a Grid (in row
+    order), and returns their coords as [start, end].'''
+    first, last = grid.cells.find(PASSAGE), grid.cells.rfind(PASSAGE)
+    grid.cells[first], grid.cells[last] = START, END
+    return [list(divmod(first, grid.cols)), list(divmod(last, grid.cols))]
+
+def carveBacktracker(grid, rng):
+    '''Carves a walled Grid into a maze with an iterative recursive backtracker (depth first search).'''
+    cells, cols = grid.cells, grid.cols
+    roomRows, roomCols = (grid.rows + 1) // 2, (cols + 1) // 2
+    visited = bytearray(roomRows * roomCols)
+    stack = array('i', [0]) # Room indices, instead of recursion
+    visited[0] = 1
+
+    while stack:
+        k = stack[-1]
+        r, c = divmod(k, roomCols)
+        options = []
+        if r > 0 and not visited[k-roomCols]: options.append(k-roomCols)
+        if r < roomRows-1 and not visited[k+roomCols]: options.append(k+roomCols)
+        if c > 0 and not visited[k-1]: options.append(k-1)
+        if c < roomCols-1 and not visited[k+1]: options.append(k+1)
+        if not options:
+            stack.pop()
+            continue
+
+        n = options[rng.randrange(len(options))]
+        nr, nc = divmod(n, roomCols)
+        cells[(r+nr)*cols + c+nc] = PASSAGE # Knock down the wall between the two rooms
+        visited[n] = 1
+        stack.append(n)
+
+def carveKruskal(grid, rng):
+    '''Carves a walled Grid into a maze with Kruskal's algorithm, using a union-find over the rooms.'''
+    cells, cols = grid.cells, grid.cols
+    roomRows, roomCols = (grid.rows + 1) // 2, (cols + 1) // 2
+    size = roomRows * roomCols
+    parent, rank = array('i', range(size)), bytearray(size)
+
+    # Wall 2k is to the right of room k, wall 2k+1 is below it
+    walls = array('i', (2*k for k in range(size) if k % roomCols < roomCols-1))
+    walls.extend(2*k+1 for k in range(size - roomCols))
+    rng.shuffle(walls)
+
+    for wall in walls:
+        a = wall >> 1
+        b = a + (roomCols if wall & 1 else 1)
+
+        # Find the sets of both rooms, halving paths along the way
+        while parent[a] != a:
+            parent[a] = parent[parent[a]]
+            a = parent[a]
+        while parent[b] != b:
+            parent[b] = parent[parent[b]]
+            b = parent[b]
+        if a == b:
+            continue
+
+        # Different sets, so knock the wall down and join them
+        if rank[a] < rank[b]:
+            a, b = b, a
+        parent[b] = a
+        if rank[a] == rank[b]:
+            rank[a] += 1
+        r, c = divmod(wall >> 1, roomCols)
+        cells[(2*r + (wall & 1))*cols + 2*c + 1 - (wall & 1)] = PASSAGE
+
+def generateEllerRows(rows, cols, rng):
+    '''Generates a maze with Eller's algorithm, yielding one row of cell codes at a time as a
+    bytearray. Only the current row of rooms is kept in memory, so any number of rows can be made.'''
+    roomRows, roomCols = (rows + 1) // 2, (cols + 1) // 2
+    labels = array('i', [0]) * roomCols # Set label of each room in the row (0 = no set yet)
+    for r in range(roomRows):
+        lastRow = r == roomRows - 1
+
+        # Give new sets to rooms not joined from above, then number the sets 0.. for the union-find
+        compact = {}
+        for c in range(roomCols):
+            if labels[c] == 0:
+                labels[c] = roomCols + 1 + c # Sets carried down from above are labelled 1..roomCols
+            labels[c] = compact.setdefault(labels[c], len(compact))
+        parent = array('i', range(len(compact)))
+
+        # Randomly join neighbouring rooms in different sets (the last row joins all of them)
+        roomRow = makeWalledGrid(1, cols).cells
+        for c in range(roomCols - 1):
+            a, b = labels[c], labels[c+1]
+            while parent[a] != a:
+                parent[a] = parent[parent[a]]
+                a = parent[a]
+            while parent[b] != b:
+                parent[b] = parent[parent[b]]
+                b = parent[b]
+            if a != b and (lastRow or rng.random() < 0.5):
+                parent[b] = a
+                roomRow[2*c + 1] = PASSAGE
+        for c in range(roomCols):
+            a = labels[c]
+            while parent[a] != a: a = parent[a]
+            labels[c] = a
+
+        # Every set carries on downwards through at least one room (rows below the last are dead ends)
+        belowRow = None
+        if lastRow and rows % 2 == 0:
+            belowRow = makeWalledGrid(1, cols).cells
+        elif not lastRow:
+            belowRow, members = bytearray([WALL]) * cols, {}
+            for c in range(roomCols):
+                members.setdefault(labels[c], []).append(c)
+            for cs in members.values():
+                for c in [c for c in cs if rng.random() < 0.5] or [cs[rng.randrange(len(cs))]]:
+                    belowRow[2*c] = PASSAGE
+            for c in range(roomCols):
+                labels[c] = labels[c] + 1 if belowRow[2*c] == PASSAGE else 0
+
+        # Open the dead ends of an even width, then place the start and end
+        if cols % 2 == 0:
+            roomRow[cols-1] = PASSAGE
+        if r == 0:
+            roomRow[0] = START
+        if lastRow:
+            finalRow = roomRow if belowRow is None else belowRow
+            finalRow[finalRow.rfind(PASSAGE)] = END
+
+        yield roomRow
+        if belowRow is not None:
+            yield belowRow
+
+def generateEller(rows, cols, rng):
+    '''Returns a Grid of <rows> by <cols> made with Eller's algorithm.'''
+    grid = Grid(rows, cols, bytearray())
+    for row in generateEllerRows(rows, cols, rng):
+        grid.cells += row
+    return grid
+
+GENERATORS = {"backtracker": carveBacktracker, "kruskal": carveKruskal, "eller": generateEller}
+
+def generateMaze(rows, cols, method="backtracker", seed=None):
+    '''Generates a maze of <rows> by <cols> (both at least 2) with the generator named <method>
+    ("backtracker", "kruskal" or "eller"), and returns it as a Maze object with the start and end
+    placed. The same <seed> always makes the same maze.'''
+    if method not in GENERATORS:
+        raise ValueError(f"Unknown generator {method!r}, expected one of: {', '.join(GENERATORS)}")
+    rng = random.Random(seed)
+    if method == "eller":
+        grid = generateEller(rows, cols, rng)
+        start, end = list(divmod(grid.cells.find(START), cols)), list(divmod(grid.cells.find(END), cols))
+    else:
+        grid = makeWalledGrid(rows, cols)
+        GENERATORS[method](grid, rng)
+        openEvenEdges(grid)
+        start, end = placeEnds(grid)
+    return Maze(grid, start, end)
+
+def generateMazeToFile(rows, cols, file_name, seed=None):
+    '''Generates a maze of <rows> by <cols> with Eller's algorithm and streams it row by row into the
+    maze file <file_name> (in any of MAZE_FORMATS), so mazes far larger than memory can be made. Returns the number of rows written.'''
+    rowData = generateEllerRows(rows, cols, random.Random(seed))
+    return writeMazeRows(rowData, rows, cols, file_name, verified=True) # Generated mazes always connect every passage
+
+########### NOTE: GENERATOR DEFINITION END ###########
+
+########### NOTE: REPLAY DEFINITION START ###########
+
+# A move log is every successful move of a run, each written as its key followed by the milliseconds
+# since the move before it (or since the start), e.g. "D412D180S95". Replaying one proves the run.
+MOVE_LOG_PATTERN = re.compile(r"([WASD])(\d+)")
+MOVE_STEPS = {"W": (-1, 0), "A": (0, -1), "S": (1, 0), "D": (0, 1)}
+TURNS = "WDSA" # Move keys in clockwise order, so turning right is one step along (and turning round is two)
+
+class ReplayResult:
+    def __init__(self, legal, reached, moves, elapsed, error=""):
+        '''Creates a ReplayResult object saying whether every move in a log was legal, whether it ended on the
+        end point, how many moves were replayed, the seconds the moves took and what went wrong, if anything'''
+        self.legal, self.reached, self.moves, self.elapsed, self.error = legal, reached, moves, elapsed, error
+
+    def isValid(self):
+        '''Checks if the log is a legal run that finishes the maze.'''
+        return self.legal and self.reached
+
+def encodeMoveLog(moveLog):
+    '''Returns a move log string from a list of [key, seconds since the previous move]. The time since the
+    start is rounded to whole milliseconds once per move, and each gap written is the difference of those,
+    so the gaps always add up to within half a millisecond of the real time however long the run.'''
+    parts, elapsed, written = [], 0.0, 0
+    for key, seconds in moveLog:
+        elapsed += seconds
+        ms = round(elapsed * 1000)
+        parts.append(f"{key}{ms - written}")
+        written = ms
+    return "".join(parts)
+
+def replayMoveLog(grid, start, end, moves):
+    '''Replays the move log string <moves> on a Grid from the <start> coords, in one tight loop over the
+    whole log instead of through movePiece. Returns a ReplayResult.'''
+    steps = MOVE_LOG_PATTERN.findall(moves)
+    if "".join(key + ms for key, ms in steps) != moves:
+        return ReplayResult(False, False, 0, 0.0, "Move log is malformed")
+
+    cells, rows, cols = grid.cells, grid.rows, grid.cols
+    r, c = start
+    for n, (key, _) in enumerate(steps):
+        dr, dc = MOVE_STEPS[key]
+        r, c = r + dr, c + dc
+        if not (0 <= r < rows and 0 <= c < cols) or cells[r*cols + c] == WALL:
+            return ReplayResult(False, False, n, 0.0, f"Move {n+1} ({key}) goes into a wall or off the maze")
+        if r == end[0] and c == end[1] and n != len(steps) - 1:
+            return ReplayResult(False, True, n + 1, 0.0, f"Move {n+1} already reaches the end, but the log goes on")
+
+    elapsed = sum(int(ms) for _, ms in steps) / 1000
+    return ReplayResult(True, [r, c] == list(end), len(steps), elapsed, "" if [r, c] == list(end) else "Log doesn't reach the end")
+
+def verifyRun(maze, player):
+    '''Checks the Player object <player> on the Maze object <maze>'s leaderboard: its move log must be a legal
+    run that reaches the end, with no move faster than MIN_MOVE_SECONDS after the one before, and can't have
+    taken longer than the time it claims. Returns a ReplayResult.'''
+    if not player.moves:
+        return ReplayResult(False, False, 0, 0.0, "No move log recorded")
+    result = replayMoveLog(maze.maze, maze.start, maze.end, player.moves)
+    if result.isValid() and result.elapsed > player.score + 0.01: # Scores are rounded to 2 decimals
+        result.legal, result.error = False, f"Moves took {result.elapsed:.2f}s but the score claims {player.score:.2f}s"
+    fastest = min(int(ms) for _, ms in MOVE_LOG_PATTERN.findall(player.moves)) if result.isValid() else 0
+    if result.isValid() and fastest + 1 < MIN_MOVE_SECONDS * 1000: # Gaps are logged to within a millisecond
+        result.legal, result.error = False, f"A move was made {fastest}ms after the one before, too fast to be played"
+    return result
+
+########### NOTE: REPLAY DEFINITION END ###########
+
+########### NOTE: BOT DEFINITION START ###########
+
+# Bots play mazes headlessly for load testing. Each bot is a generator yielding the moves it wants to make as
+# strings of up to BOT_BATCH keys, which playBot sends through Maze.applyMoves.
+STEP_KEYS = {step: key for key, step in MOVE_STEPS.items()} # Move key of each (row change, column change)
+
+def randomWalkBot(maze, rng, run):
+    '''Yields random moves forever, bumping into walls as it goes.'''
+    while True:
+        yield "".join(rng.choices(TURNS, k=BOT_BATCH))
+
+def wallFollowerBot(maze, rng, run):
+    '''Yields the moves of a wall follower, keeping its right hand on the wall on even runs and its left hand
+    on odd runs, until it reaches the end. Stops if it is boxed in.'''
+    grid, (r, c), end = maze.maze, maze.start, maze.end
+    turns = [1, 0, 3, 2] if run % 2 == 0 else [3, 0, 1, 2] # Order to try turning in: hand side, ahead, other side, back
+    heading, batch = 0, []
+    while [r, c] != end:
+        for turn in turns:
+            key = TURNS[(heading + turn) % 4]
+            dr, dc = MOVE_STEPS[key]
+            if grid.inBounds(r + dr, c + dc) and grid.get(r + dr, c + dc) != WALL:
+                break
+        else:
+            break
+        heading, r, c = TURNS.index(key), r + dr, c + dc
+        batch.append(key)
+        if len(batch) == BOT_BATCH:
+            yield "".join(batch)
+            batch = []
+    yield "".join(batch)
+
+def solverBot(maze, rng, run):
+    '''Yields the moves of a shortest path from the start to the end, found on the maze's JunctionGraph (or
+    with solve, for mazes too big for one).'''
+    graph = maze.getJunctionGraph()
+    path = graph.solve().path if graph else solve(maze, "bidirectional").path
+    keys = "".join(STEP_KEYS[(r2 - r1, c2 - c1)] for (r1, c1), (r2, c2) in zip(path, path[1:]))
+    for i in range(0, len(keys), BOT_BATCH):
+        yield keys[i:i + BOT_BATCH]
+
+BOTS = {"random": randomWalkBot, "wall": wallFollowerBot, "solver": solverBot}
+
+def playBot(maze, bot, max_moves):
+    '''Plays one run of the Maze object <maze> with the moves yielded by the bot generator <bot>, until the end
+    is reached, <max_moves> keys have been sent or the bot gives up. After an illegal move, the rest of that
+    batch carries on from the key after it. Returns [moves made, keys sent, True if the end was reached].'''
+    pos, made, sent = maze.start.copy(), 0, 0
+    for keys in bot:
+        keys = keys[:max_moves - sent]
+        sent += len(keys)
+        while keys:
+            illegal = maze.applyMoves(pos, keys)[1]
+            if pos == maze.end:
+                return [made + (len(keys) if illegal < 0 else illegal), sent, True]
+            if illegal < 0:
+                made += len(keys)
+                break
+            made, keys = made + illegal, keys[illegal + 1:]
+        if sent >= max_moves:
+            break
+    return [made, sent, False]
+
+def playBots(maze, kind, runs, first, max_moves, seed):
+    '''Plays runs <first> up to <first> + <runs> of the Maze object <maze> with the bot named <kind>, each
+    seeded from <seed> and its run number. Returns the totals as a dict.'''
+    totals = {"runs": runs, "wins": 0, "moves": 0, "keys": 0}
+    startTime = time.perf_counter()
+    for run in range(first, first + runs):
+        made, sent, won = playBot(maze, BOTS[kind](maze, random.Random(seed + run), run), max_moves)
+        totals["moves"], totals["keys"], totals["wins"] = totals["moves"] + made, totals["keys"] + sent, totals["wins"] + won
+    totals["seconds"] = time.perf_counter() - startTime
+    return totals
+
+########### NOTE: BOT DEFINITION END ###########
+
+########### NOTE: BENCHMARK DEFINITION START ###########
+# Times the hot paths of the game on synthetic mazes and leaderboards (see "python3 mazer.py bench").
+# Every result is the best time for one call over a few repeats, so runs can be saved and compared.
+
+def timeCall(fn, repeat=3, per=1):
+    '''Returns the best time in seconds for one call of <fn> (or for one of the <per> operations each call
+    does) over <repeat> runs, where each run calls it enough times to take at least 0.2 seconds.'''
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / (number * per)
+
+def benchMaze(size, work_dir, repeat=3):
+    '''Times the maze benchmarks on a <size> x <size> maze generated into <work_dir>. Anything the game
+    prints is thrown away. Returns a list of [benchmark name, seconds].'''
+    file_name = os.path.join(work_dir, f"bench_{size}.csv")
+    generateMazeToFile(size, size, file_name, seed=size)
+    maze, results = Maze([], [0, 0], [0, 0]), []
+    ignore = lambda message: None
+
+    global mazeCache
+    with open(os.devnull, "w") as null, contextlib.redirect_stdout(null):
+        saved = mazeCache
+        try: # Reading the file every time, then from a cache of its own (the maze benchmarked below is the one read from the file)
+            mazeCache = MazeCache("0", 0)
+            results.append(["loadMaze", timeCall(lambda: maze.loadMaze(file_name), repeat)])
+            if os.path.getsize(file_name) >= CACHE_MIN_BYTES: # Smaller files are never cached
+                mazeCache = MazeCache(os.path.join(work_dir, "cache"), CACHE_LIMIT)
+                cached = Maze([], [0, 0], [0, 0])
+                cached.loadMaze(file_name)
+                results.append(["loadMaze (cached)", timeCall(lambda: cached.loadMaze(file_name), repeat)])
+        finally:
+            mazeCache = saved
+        results.append(["verifyAB", timeCall(lambda: verifyAB(maze.maze, "A", "B"), repeat)])
+        results.append(["makeCopy", timeCall(maze.makeCopy, repeat)])
+        overlay = {tuple(maze.start): "A"}
+        # The same view size whatever the terminal, so results compare between machines
+        results.append(["printMaze", timeCall(lambda: maze.printMaze(overlay, size=[VIEW_FALLBACK, VIEW_FALLBACK]), repeat)])
+
+        # Step off the start and back again, timing each move
+        pos = maze.start.copy()
+        key = [key for key in "WASD" if maze.movePiece(maze.start.copy(), key, ["X"], ignore)][0]
+        back = {"W":"S", "S":"W", "A":"D", "D":"A"}[key]
+        results.append(["movePiece", timeCall(lambda: (maze.movePiece(pos, key, ["X"], ignore),
+                                                       maze.movePiece(pos, back, ["X"], ignore)), repeat, per=2)])
+        moves = (key + back) * 500 # The same moves again, sent in one batch
+        results.append(["applyMoves", timeCall(lambda: maze.applyMoves(pos, moves), repeat, per=len(moves))])
+        results.append(["getMazeDigest", timeCall(lambda: (maze.digests.clear(), maze.getMazeDigest()), repeat)])
+        results.append(["JunctionGraph", timeCall(lambda: JunctionGraph(maze.maze, maze.start, maze.end), repeat)])
+    return results
+
+def benchLeaderboard(boards, work_dir, repeat=3):
+    '''Times the leaderboard benchmarks on a leaderboard file of <boards> full boards written into <work_dir>.
+    Returns a list of [benchmark name, seconds].'''
+    file_name, rng = os.path.join(work_dir, f"bench_{boards}.txt"), random.Random(boards)
+    digests = [hashlib.md5(str(i).encode()).hexdigest() for i in range(boards)]
+    with open(file_name, "w") as f:
+        f.write("\n;\n".join("\n".join([digest_id] + [f"player{i}|{score}" for i, score in
+                                                     enumerate(sorted(round(rng.uniform(1, 100), 2) for _ in range(BOARD_SIZE)))])
+                             for digest_id in digests))
+
+    results = []
+    # Each leaderboard registers itself to be saved on exit, which would keep every one made here alive
+    results.append(["Leaderboard.__init__", timeCall(lambda: atexit.unregister(Leaderboard(file_name).compact), repeat)])
+    l_board = Leaderboard(file_name)
+    atexit.unregister(l_board.compact)
+    digest_id = digests[boards // 2]
+    results.append(["Leaderboard.getBoard", timeCall(lambda: l_board.getBoard(digest_id), repeat)])
+    results.append(["Leaderboard.updateLeaderboard", timeCall(l_board.updateLeaderboard, repeat)])
+    board = l_board.getBoard(digest_id)
+    score = board.scores[len(board.scores) // 2]
+    results.append(["Board.getRank", timeCall(lambda: board.getRank(score), repeat)])
+    return results
+
+def benchStartup(python, work_dir, repeat=3):
+    '''Times starting a new <python> interpreter process, and starting one that imports this game (as every
+    worker process and command line tool does), in <work_dir>. Returns a list of [benchmark name, seconds].'''
+    import subprocess
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+    env.pop("MAZER_PROFILE", None)
+    start = lambda code: subprocess.run([python, "-c", code], cwd=work_dir, env=env, check=True)
+    return [["python", timeCall(lambda: start("pass"), repeat)], ["import mazer", timeCall(lambda: start("import mazer"), repeat)]]
+
+########### NOTE: BENCHMARK DEFINITION END ###########
+
+########### NOTE: SERVER DEFINITION START ###########
+
+# The game server speaks a line protocol. Each command is one line, and gets one reply line back, except
+# LIST, VIEW and BOARD, whose reply line ends with how many more lines follow it.
+#   HELLO <name>        -> OK                                   Names the player, for the leaderboard
+#   LIST                -> MAZES <n>, then <digest> <rows> <cols> <file> per maze
+#   PLAY <digest>       -> START <row> <col> <par>              Starts a run from the maze's start
+#   MOVE <key>          -> POS <row> <col> <moves>, or BLOCKED <row> <col> <moves>, or WIN <seconds> <moves>
+#                          <rank (0 if unranked)>. One key per MOVE, so every move of a ranked run is timed.
+#   VIEW <rows> <cols>  -> VIEW <n> <top> <left>, then n rows of cell characters around the player
+#   BOARD               -> BOARD <n>, then <score> <name> per player on the maze's leaderboard
+#   QUIT                -> BYE
+# Anything that can't be done replies ERR <message>.
+SERVER_MULTILINE = ["MAZES", "VIEW", "BOARD"] # Replies followed by more lines
+
+class GameSession:
+    def __init__(self):
+        '''Creates the state of one player connected to the game server. Only the player's position and
+        move log are kept, as every session plays on the server's one copy of each maze.'''
+        self.name = "Anonymous"
+        self.digest, self.maze = None, None # Maze being played, or None between runs
+        self.pos, self.moveLog = [0, 0], []
+        self.startTime = self.lastMoveTime = 0.0
+
+########### NOTE: CLASS METHODS ###########
+    def play(self, digest, maze):
+        '''Starts a new run of the Maze object <maze> (with the id <digest>) from its start.'''
+        self.digest, self.maze = digest, maze
+        self.pos, self.moveLog = maze.start.copy(), []
+        self.startTime = self.lastMoveTime = time.time()
+
+    def move(self, key):
+        '''Moves the player one step by the upper case W/A/S/D <key>, and logs the move with the time since the
+        last one. Returns True if the move was made, or False if it was blocked.'''
+        if self.maze.applyMoves(self.pos, key)[1] >= 0:
+            return False
+        moveTime = time.time()
+        self.moveLog.append([key, moveTime - self.lastMoveTime])
+        self.lastMoveTime = moveTime
+        return True
+
+class MazeServer:
+    def __init__(self, l_board):
+        '''Creates a game server that records wins to the Leaderboard (or SQLiteLeaderboard) object <l_board>.
+        Wins are ranked straight away on the server's own copies of the boards, then written to <l_board> in
+        batches from another thread, so sessions never wait on the disk.'''
+        self.l_board = l_board
+        self.mazes, self.files = {}, {} # Maze objects and their file names by digest, shared by every session
+        self.boards = {} # Board objects by digest, copied from l_board when each maze is added
+        self.pending = [] # Wins not yet written to l_board, as (digest, Player object)
+        self.sessions = 0 # Sessions connected right now
+
+########### NOTE: CLASS METHODS ###########
+    def addMaze(self, maze, file_name):
+        '''Adds the Maze object <maze> (read from <file_name>) to the mazes that can be played, unless the same
+        maze is already there. Returns its digest.'''
+        digest = maze.getMazeDigest()
+        if digest not in self.mazes:
+            maze.getJunctionGraph() # Built once here, instead of by the first player
+            self.mazes[digest], self.files[digest] = maze, file_name
+            self.boards[digest] = Board(digest, list(self.l_board.getBoard(digest).players))
+        return digest
+
+    def reply(self, session, words):
+        '''Returns the lines replying to the command split into <words>, sent by the GameSession <session>.'''
+        command, args = (words[0].upper(), words[1:]) if words else ("", [])
+        if command == "HELLO":
+            name = " ".join(args)
+            if name == "" or len(name) > 25 or "|" in name:
+                return ["ERR Invalid name / Name too long!"]
+            session.name = name
+            return ["OK"]
+        elif command == "LIST":
+            return [f"MAZES {len(self.mazes)}"] + [f"{digest} {maze.maze.rows} {maze.maze.cols} {self.files[digest]}"
+                                                   for digest, maze in self.mazes.items()]
+        elif command == "PLAY":
+            maze = self.mazes.get(args[0] if args else "")
+            if maze is None:
+                return ["ERR No maze with that digest!"]
+            session.play(args[0], maze)
+            graph = maze.getJunctionGraph()
+            return [f"START {maze.start[0]} {maze.start[1]} {graph.get(maze.start[0], maze.start[1]) if graph else -1}"]
+        elif command == "BOARD":
+            board = self.boards.get(session.digest)
+            if board is None:
+                return ["ERR No maze being played!"]
+            return [f"BOARD {len(board.players)}"] + [f"{p.score} {p.playerID}" for p in board.players]
+        elif command == "QUIT":
+            return ["BYE"]
+        elif session.maze is None:
+            return ["ERR No maze being played!" if command in ("MOVE", "VIEW") else "ERR Unknown command!"]
+        elif command == "MOVE":
+            key = "".join(args).upper()
+            if len(key) != 1 or key not in MOVE_STEPS: # Batches would let a whole run be sent at once, in no time
+                return ["ERR Invalid Input. Send one move at a time: W, A, S or D."]
+            moved = session.move(key)
+            if session.pos == session.maze.end:
+                return [self.win(session)]
+            return [f"{'POS' if moved else 'BLOCKED'} {session.pos[0]} {session.pos[1]} {len(session.moveLog)}"]
+        elif command == "VIEW":
+            if len(args) != 2 or not all(arg.isdigit() for arg in args):
+                return ["ERR VIEW needs the rows and columns to send!"]
+            return self.view(session, [min(int(arg), SERVER_VIEW_LIMIT) for arg in args])
+        return ["ERR Unknown command!"]
+
+    def view(self, session, size):
+        '''Returns the VIEW reply: the part of <session>'s maze that fits in <size> as [rows, columns] around
+        the player, as rows of cell characters with the player drawn over the maze.'''
+        maze = session.maze
+        top, left, rows, cols = maze.viewport(session.pos, size)
+        overlay = {tuple(maze.start): "O"}
+        overlay[tuple(session.pos)] = "A"
+        lines = [f"VIEW {rows} {top} {left}"]
+        for r in range(top, top + rows):
+            row = bytearray(maze.maze.rowSlice(r, left, left + cols).translate(CELLS_TO_TEXT))
+            for (pr, pc), ch in overlay.items():
+                if pr == r and left <= pc < left + cols:
+                    row[pc - left] = ord(ch)
+            lines.append(row.decode())
+        return lines
+
+    def win(self, session):
+        '''Ends <session>'s run, which has just reached the end, and ranks it. Ranked wins are queued to be
+        written to the leaderboard by flushWins. Runs with a move made faster than MIN_MOVE_SECONDS after the
+        one before were scripted, not played, so they are never ranked. Returns the WIN reply.'''
+        timeTaken = round(time.time() - session.startTime, 2)
+        player = Player(session.name, timeTaken, encodeMoveLog(session.moveLog))
+        if min(seconds for _, seconds in session.moveLog) < MIN_MOVE_SECONDS:
+            rank = -1
+        else:
+            rank = self.boards[session.digest].addPlayer(player)
+        if rank >= 0:
+            self.pending.append((session.digest, player))
+        session.maze = None
+        return f"WIN {timeTaken} {len(session.moveLog)} {rank + 1}"
+
+    async def handle(self, reader, writer):
+        '''Runs the session of one connection, replying to each command until QUIT or the client goes away.'''
+        session = GameSession()
+        self.sessions += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                reply = self.reply(session, line.decode("utf-8", "replace").split())
+                writer.write(("\n".join(reply) + "\n").encode())
+                await writer.drain()
+                if reply[0] == "BYE":
+                    break
+        except (ConnectionError, ValueError): # ValueError for lines too long to read
+            pass
+        finally:
+            self.sessions -= 1
+            writer.close()
+
+    async def flushWins(self, pool):
+        '''Writes the wins waiting in self.pending to the leaderboard in one batch, on the thread pool <pool>
+        so the event loop never waits on the disk. Wins that fail to be written are kept for the next try.'''
+        import asyncio
+        if self.pending:
+            wins, self.pending = self.pending, []
+            try:
+                await asyncio.get_event_loop().run_in_executor(pool, self.l_board.recordWins, wins)
+                profiler.count("wins flushed", len(wins))
+            except (OSError, sqlite3.Error) as e:
+                print(f"Couldn't save {len(wins)} wins to the leaderboard ({e}), trying again later.")
+                self.pending[:0] = wins
+
+    async def flushForever(self, pool):
+        '''Flushes waiting wins every SERVER_FLUSH_SECONDS.'''
+        import asyncio
+        while True:
+            await asyncio.sleep(SERVER_FLUSH_SECONDS)
+            await self.flushWins(pool)
+
+    async def serve(self, host, port):
+        '''Accepts sessions on <host>:<port> until cancelled (e.g. by Ctrl+C), then writes any waiting wins.'''
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+        pool = ThreadPoolExecutor(max_workers=1) # A single writer, so batches reach the leaderboard in order
+        server = await asyncio.start_server(self.handle, host, port, backlog=SERVER_BACKLOG)
+        flusher = asyncio.ensure_future(self.flushForever(pool))
+        print(f"Serving {len(self.mazes)} mazes on {host}:{port} (Ctrl+C to stop)")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            flusher.cancel()
+            await self.flushWins(pool)
+            pool.shutdown()
+
+class ServerConnection:
+    def __init__(self, host, port):
+        '''Connects to the game server at <host>:<port> for the terminal client.'''
+        import socket
+        self.sock = socket.create_connection((host, port))
+        self.file = self.sock.makefile("rw", encoding="utf-8", newline="\n")
+
+########### NOTE: CLASS METHODS ###########
+    def request(self, line):
+        '''Sends the command <line> and returns the words of the reply, plus a list of the lines following it.'''
+        self.file.write(line + "\n")
+        self.file.flush()
+        words = self.file.readline().split()
+        if not words:
+            raise ConnectionError("The server closed the connection!")
+        count = int(words[1]) if words[0] in SERVER_MULTILINE else 0
+        return words, [self.file.readline().rstrip("\n") for _ in range(count)]
+
+    def close(self):
+        self.sock.close()
+
+def runClient(host, port):
+    '''Plays on the game server at <host>:<port> from the terminal. The server runs the game, so the client
+    only draws what it is sent and sends on the keys pressed.'''
+    conn = ServerConnection(host, port)
+    try:
+        while True:
+            words, _ = conn.request("HELLO " + (input("Enter your name: ") or "Anonymous"))
+            if words[0] == "OK":
+                break
+            print(" ".join(words[1:]) + "\n")
+
+        _, mazes = conn.request("LIST")
+        if not mazes:
+            print("The server has no mazes!")
+            return
+        for i, line in enumerate(mazes):
+            digest, rows, cols, file_name = line.split(" ", 3)
+            print(f"{i+1}: {file_name} ({rows} x {cols})")
+        digest = mazes[IntInput("Pick a maze: ", 1, len(mazes)) - 1].split()[0]
+
+        words, _ = conn.request(f"PLAY {digest}")
+        moves, par, notice, cellStrs = 0, words[3] if words[3] != "-1" else "?", "", cellStrings()
+        while True:
+            words, rows = conn.request("VIEW {} {}".format(*viewSize()))
+            printSeparator(36)
+            sys.stdout.write("".join("".join(cellStrs[CELL_CODES[ch]] for ch in row) + "\n" for row in rows))
+            print(f"{notice}\nMoves made: {moves} (par {par})\n")
+            user_input = input("Press 'W' for UP, 'A' for LEFT, 'S' for DOWN, 'D' for RIGHT, 'M' for MAIN MENU: ").strip()
+            if user_input.upper() == "M":
+                break
+            words, _ = conn.request(f"MOVE {user_input or '?'}")
+            notice = ""
+            if words[0] == "POS":
+                moves = int(words[3])
+            elif words[0] == "BLOCKED":
+                moves, notice = int(words[3]), "\nInvalid Movement. Please try again.\n"
+            elif words[0] == "ERR":
+                notice = "\n" + " ".join(words[1:]) + "\n"
+            elif words[0] == "WIN":
+                print("Congratulations! You win! ~\n")
+                print(f"You took {words[2]} moves (par {par}) in {words[1]} seconds.")
+                if words[3] != "0":
+                    print(f"You're ranked {words[3]} on the leaderboards!")
+                _, players = conn.request("BOARD")
+                printSeparator(36)
+                for rank, line in enumerate(players):
+                    score, name = line.split(" ", 1)
+                    print(f"{rank+1}. {name} - {score}s")
+                break
+        conn.request("QUIT")
+    finally:
+        conn.close()
+
+async def requestAsync(reader, writer, line):
+    '''Sends the command <line> to the game server over an asyncio connection and returns the words of the
+    reply, plus a list of the lines following it (like ServerConnection.request).'''
+    writer.write(line.encode() + b"\n")
+    words = (await reader.readline()).decode().split()
+    if not words:
+        raise ConnectionError("The server closed the connection!")
+    count = int(words[1]) if words[0] in SERVER_MULTILINE else 0
+    return words, [(await reader.readline()).decode().rstrip("\n") for _ in range(count)]
+
+async def loadSession(host, port, n, moves, rng, stats):
+    '''Plays <moves> random moves as bot <n> on the game server at <host>:<port>, picking a random maze for
+    each run and starting another after each win. Adds up its moves, wins and errors in the dict <stats>, and
+    the seconds each move took in stats["latency"].'''
+    import asyncio
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        stats["errors"] += 1
+        return
+    try:
+        await requestAsync(reader, writer, f"HELLO bot{n}")
+        _, mazes = await requestAsync(reader, writer, "LIST")
+        words = ["WIN"]
+        for _ in range(moves):
+            if words[0] == "WIN":
+                await requestAsync(reader, writer, "PLAY " + rng.choice(mazes).split()[0])
+            sent = time.perf_counter()
+            words, _ = await requestAsync(reader, writer, "MOVE " + rng.choice("WASD"))
+            stats["latency"].append(time.perf_counter() - sent)
+            stats["moves"] += 1
+            stats["wins"] += words[0] == "WIN"
+            stats["errors"] += words[0] == "ERR"
+        await requestAsync(reader, writer, "QUIT")
+    except (OSError, IndexError, ValueError):
+        stats["errors"] += 1
+    finally:
+        writer.close()
+
+async def loadTest(host, port, sessions, moves, seed):
+    '''Runs <sessions> bots at once against the game server at <host>:<port>, each making <moves> random
+    moves. Returns the results as a dict.'''
+    import asyncio
+    stats = {"moves": 0, "wins": 0, "errors": 0, "latency": []}
+    startTime = time.perf_counter()
+    await asyncio.gather(*[loadSession(host, port, n, moves, random.Random(seed + n), stats) for n in range(sessions)])
+    seconds = time.perf_counter() - startTime
+    latency = sorted(stats.pop("latency")) or [0.0]
+    return dict(stats, sessions=sessions, seconds=round(seconds, 3), moves_per_second=round(stats["moves"] / seconds),
+                p50_ms=round(latency[len(latency) // 2] * 1000, 3), p99_ms=round(latency[len(latency) * 99 // 100] * 1000, 3),
+                ok=stats["errors"] == 0)
+
+def raiseFileLimit():
+    '''Raises the limit on open files for this process as far as it can go, as every session is a connection.
+    Does nothing where the limit can't be changed (e.g. on Windows).'''
+    try:
+        import resource
+        hard = resource.getrlimit(resource.RLIMIT_NOFILE)[1]
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+########### NOTE: SERVER DEFINITION END ###########
+
 # NOTE: GLOBAL FUNCTIONS
 def displayMenu(optionDict, qn, error_msg): 
     '''Displays a menu and accepts input. Does not support lowercase keys.'''
@@ -505,6 +3046,18 @@ def displayMenu(optionDict, qn, error_msg):
         print(error_msg)
         return -1
 
+def cellStrings():
+    '''Returns the printable text of every cell code (indexed by code) for the current print mode.'''
+    if globalPrintMode == 1:
+        return [TERMINAL_COLORS[ch] + VISUAL_CHARS[ch] + "\033[0m " for ch in CELL_CHARS]
+    return [VISUAL_CHARS[ch] + " " for ch in CELL_CHARS]
+
+def viewSize():
+    '''Returns the rows and columns of maze cells that fit in the terminal as [rows, columns], leaving
+    room for the lines printed around a maze.'''
+    size = shutil.get_terminal_size((2 * VIEW_FALLBACK, VIEW_FALLBACK + FRAME_TOP + VIEW_STATUS_LINES))
+    return [size.lines - FRAME_TOP - VIEW_STATUS_LINES, size.columns // 2]
+
 def printSeparator(spaces):
     print("="*spaces+"\n")
 
@@ -521,20 +3074,17 @@ def IntInput(msg, minX, maxX):
             print("Invalid Input!\n")
 
 def verifyAB(maze, start_char, end_char):
-        '''Verifies if there are only 1 set of start_char and end_char characters within a 2D list,
+        '''Verifies if there are only 1 set of start_char and end_char characters within a Grid,
         and returns the positions if they exist, else it is defaulted to [0,0]'''
-        a_validate, b_validate, start, end = 0, 0, [0,0], [0,0]
-
-        # Iterate through the list and locate all occurences of "A" and "B"
-        for i in range(len(maze)):
-            for j in range(len(maze[0])):
+        start, end = [0,0], [0,0]
+        start_code, end_code = CELL_CODES[start_char], CELL_CODES[end_char]
 
-                if maze[i][j] == start_char:
-                    a_validate += 1
-                    start = [i, j]
-                elif maze[i][j] == end_char:
-                    b_validate += 1
-                    end = [i, j]
+        # Count and locate all occurences of "A" and "B" (bytearray searches run over the whole grid at once)
+        a_validate, b_validate = maze.cells.count(start_code), maze.cells.count(end_code)
+        if a_validate > 0:
+            start = list(divmod(maze.cells.rfind(start_code), maze.cols))
+        if b_validate > 0:
+            end = list(divmod(maze.cells.rfind(end_code), maze.cols))
 
         # Validate if there is only 1 set of "A" and "B"
         if a_validate != 1 or b_validate != 1:
@@ -545,6 +3095,292 @@ def verifyAB(maze, start_char, end_char):
 
         return [valid, start, end]
 
+def locateCell(grid, code):
+    '''Returns the coords of the only cell with the cell code <code> in a Grid, or None if there isn't exactly one.'''
+    if grid.cells.count(code) != 1:
+        return None
+    return list(divmod(grid.cells.find(code), grid.cols))
+
+def cellCode(char, allowed=CELL_CHARS[:4]):
+    '''Returns the cell code of the cell character <char> (in either case), or raises ValueError if it
+    isn't one of the characters in <allowed>.'''
+    if len(char) != 1 or char.upper() not in allowed:
+        raise ValueError(f"Invalid cell {char!r}, expected one of: {', '.join(allowed)}!")
+    return CELL_CODES[char.upper()]
+
+def readPatchFile(file_name):
+    '''Reads the cells of a piece of maze to paste from the maze file <file_name> (in any of MAZE_FORMATS). Unlike a maze,
+    the rows can be of any length and don't need a start or end. Returns a list with the cell codes
+    of each row as bytes, or raises ValueError saying which line is invalid.'''
+    if file_name.endswith(".mzb"):
+        grid = readMZBFile(file_name)[0]
+        try:
+            return [grid.row(r) for r in range(grid.rows)]
+        finally:
+            grid.close()
+
+    rows = []
+    with readingMazeText(file_name) as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            row = line.translate(TEXT_TO_CELLS)
+            if row and max(row) > END:
+                c = next(c for c in range(len(row)) if row[c] > END)
+                raise ValueError(f"Line {line_no}: Invalid character {chr(line[c])!r} in column {c+1}, mazes can only contain {', '.join(CELL_CHARS[:4])}!")
+            rows.append(row)
+    while rows and not rows[-1]: # Ignore blank lines at the end
+        rows.pop()
+    if not rows:
+        raise ValueError("Invalid paste! The file is empty!")
+    return rows
+
+def readMazeFile(file_name):
+    '''Reads the maze in the text file <file_name> (compressed or not, see openMazeText) in a single pass, a
+    line at a time, straight into a Grid. The shape, characters and start/end points are checked as each
+    line is read, so a bad file fails on its first bad line. Returns [grid, start, end], or raises ValueError saying which line is invalid.'''
+    cells, rows, cols, start, end, blank = bytearray(), 0, 0, None, None, 0
+    with readingMazeText(file_name) as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line: # Blank lines are only allowed at the end of the file
+                blank = blank or line_no
+                continue
+            if blank:
+                raise ValueError(f"Line {blank}: Blank line in the middle of the maze!")
+
+            # Validate maze is square or rectangle
+            if rows == 0:
+                cols = len(line)
+            elif len(line) != cols:
+                raise ValueError(f"Line {line_no}: Maze should be of shape square or rectangle, not uneven! ({len(line)} cells instead of {cols})")
+
+            # Validate line only contains maze characters
+            row = line.translate(TEXT_TO_CELLS)
+            if max(row) > END:
+                c = next(c for c in range(cols) if row[c] > END)
+                raise ValueError(f"Line {line_no}: Invalid character {chr(line[c])!r} in column {c+1}, mazes can only contain {', '.join(CELL_CHARS[:4])}!")
+
+            # Validate maze has only 1 set of start and end points
+            for code, name in [(START, "starting point"), (END, "end point")]:
+                if code in row:
+                    if row.count(code) > 1 or (start if code == START else end) is not None:
+                        raise ValueError(f"Line {line_no}: Invalid maze! Maze contains more than 1 {name}!")
+                    if code == START:
+                        start = [rows, row.index(code)]
+                    else:
+                        end = [rows, row.index(code)]
+
+            cells += row
+            rows += 1
+
+    if rows == 0:
+        raise ValueError("Invalid maze! The file is empty!")
+    if start is None or end is None:
+        raise ValueError(f"Invalid maze! Maze contains [{int(start is not None)}/1] starting points and [{int(end is not None)}/1] end points!")
+    return [Grid(rows, cols, cells), start, end]
+
+def openMazeFile(file_name):
+    '''Reads the maze file <file_name> (in any of MAZE_FORMATS) and validates it, including that the end can be reached
+    from the start. Big text files are opened from the cache (see MazeCache) while they haven't changed.
+    Returns [grid, start, end], or raises ValueError saying why the maze is invalid.'''
+
+    # Validation for .csv/.mzb file (text ones may be compressed)
+    fileFormat = mazeFileFormat(file_name)
+    if fileFormat is None:
+        raise ValueError(f"Invalid maze file! Maze files end with {', '.join('.' + fmt for fmt in MAZE_FORMATS)}!")
+
+    if fileFormat == "mzb":
+        grid, start, end, verified = readMZBFile(file_name) # Memory mapped, cells are read as needed
+    else: # Big text files are kept packed in the cache, and opened from there while they haven't changed
+        stat = os.stat(file_name)
+        cached = stat.st_size >= CACHE_MIN_BYTES and mazeCache.lookup(file_name, stat)
+        if cached:
+            return cached # Validated before it was cached
+        (grid, start, end), verified = readMazeFile(file_name), False
+
+    # Validate maze can actually be solved (.mzb files may already say so)
+    if not verified and not canReach(grid, start, end):
+        grid.close()
+        raise ValueError("Invalid maze! The end point can't be reached from the starting point!")
+    if fileFormat != "mzb" and stat.st_size >= CACHE_MIN_BYTES:
+        mazeCache.store(file_name, stat, grid, start, end)
+    return [grid, start, end]
+
+def packBits(bits):
+    '''Packs bytes of 0s and 1s (a multiple of 8 long) into bytes holding 8 of them each, first in the
+    highest bit. Each of the 8 bit positions is done in one go with big integers, instead of per cell.'''
+    packed = 0
+    for k in range(8):
+        packed |= int.from_bytes(bits[k::8], 'big') << (7 - k)
+    return packed.to_bytes(len(bits) // 8, 'big')
+
+def unpackBits(packed):
+    '''Unpacks bytes made by packBits back into a bytearray of 0s and 1s.'''
+    n = len(packed)
+    value, ones = int.from_bytes(packed, 'big'), int.from_bytes(b"\x01" * n, 'big')
+    bits = bytearray(8 * n)
+    for k in range(8):
+        bits[k::8] = ((value >> (7 - k)) & ones).to_bytes(n, 'big')
+    return bits
+
+def readMZBFile(file_name):
+    '''Opens the .mzb file <file_name> by memory mapping it, or for mazes of more than TILED_CELLS cells by
+    reading it a tile at a time (see TiledCells), so cells are only read from disk when used.
+    Returns [grid, start, end, verified], or raises ValueError if the file isn't a valid .mzb file.'''
+    with open(file_name, 'rb') as f:
+        fileSize = os.fstat(f.fileno()).st_size
+        if fileSize < MZB_HEADER.size:
+            raise ValueError("Invalid .mzb file! The header is incomplete!")
+        magic, version, flags, rows, cols, sr, sc, er, ec, digest = MZB_HEADER.unpack(f.read(MZB_HEADER.size))
+        if magic != MZB_MAGIC:
+            raise ValueError("Invalid .mzb file!")
+        if version != MZB_VERSION:
+            raise ValueError(f"Invalid .mzb file! Unsupported format version {version}!")
+        if fileSize < MZB_HEADER.size + (rows * cols + 7) // 8:
+            raise ValueError("Invalid .mzb file! The maze data is incomplete!")
+        if rows == 0 or sr == NO_CELL or er == NO_CELL:
+            raise ValueError(f"Invalid maze! Maze contains [{int(sr != NO_CELL)}/1] starting points and [{int(er != NO_CELL)}/1] end points!")
+        if sr >= rows or sc >= cols or er >= rows or ec >= cols:
+            raise ValueError("Invalid .mzb file! The start or end is outside the maze!")
+        tiled = rows * cols > TILED_CELLS
+        if not tiled: # Only mapped once the file is known to be valid, so nothing is left open when it isn't
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if tiled:
+        cells = TiledCells(open(file_name, 'rb'), MZB_HEADER.size, rows, cols, sr*cols + sc, er*cols + ec)
+        return [TiledGrid(rows, cols, cells, digest.hex()), [sr, sc], [er, ec], bool(flags & MZB_VERIFIED)]
+    cells = PackedCells(data, MZB_HEADER.size, rows * cols, sr*cols + sc, er*cols + ec)
+    return [PackedGrid(rows, cols, cells, digest.hex()), [sr, sc], [er, ec], bool(flags & MZB_VERIFIED)]
+
+def writeMZBFile(grid, file_name, verified=False):
+    '''Writes the Grid <grid> (with its start and end) to the .mzb file <file_name>, a row at a time.'''
+    writer = MZBWriter(file_name, grid.rows, grid.cols)
+    for r in range(grid.rows):
+        writer.writeRow(grid.row(r))
+    writer.close(verified)
+
+def writeMazeFile(grid, file_name, verified=False):
+    '''Writes the Grid <grid> (with its start and end) to the maze file <file_name> a row at a time, in the
+    format given by its extension (see writeMazeRows). Returns the number of rows written.'''
+    return writeMazeRows((grid.row(r) for r in range(grid.rows)), grid.rows, grid.cols, file_name, verified)
+
+def writeMazeRows(rowData, rows, cols, file_name, verified=False):
+    '''Streams the <rows> rows of cell codes (bytes of <cols> cells each) from the iterable <rowData> into the
+    maze file <file_name>, in the format given by its extension (one of MAZE_FORMATS). <verified> is saved in
+    .mzb files. Only a row is held at a time, and the file is only replaced once it's complete (see
+    replacedAtomically). Returns the number of rows written, or raises ValueError for unknown extensions.'''
+    fileFormat = mazeFileFormat(file_name)
+    if fileFormat is None:
+        raise ValueError(f"Invalid maze file! Maze files end with {', '.join('.' + fmt for fmt in MAZE_FORMATS)}!")
+
+    with replacedAtomically(file_name) as temp:
+        if fileFormat == "mzb":
+            writer = MZBWriter(temp, rows, cols)
+            for row in rowData:
+                writer.writeRow(row)
+            writer.close(verified)
+        else:
+            with openMazeText(temp, 'wb', fileFormat) as f:
+                for row in rowData:
+                    f.write(row.translate(CELLS_TO_TEXT) + b"\n")
+    return rows
+
+def mazeFileFormat(file_name):
+    '''Returns the format of the maze file <file_name> going by its extension (one of MAZE_FORMATS), or None.'''
+    for fileFormat in sorted(MAZE_FORMATS, key=len, reverse=True): # .csv.gz before .csv
+        if file_name.endswith("." + fileFormat):
+            return fileFormat
+    return None
+
+def openMazeText(file_name, mode='rb', fileFormat=None):
+    '''Opens the maze text file <file_name> for reading or writing bytes (<mode> 'rb' or 'wb'), through gzip
+    or lzma for .csv.gz and .csv.xz files, so compressed mazes are read and written like any other. The format
+    comes from the file's extension unless given as <fileFormat>.'''
+    fileFormat = fileFormat or mazeFileFormat(file_name)
+    if fileFormat == "csv.gz":
+        import gzip
+        return gzip.open(file_name, mode, compresslevel=GZIP_LEVEL)
+    if fileFormat == "csv.xz":
+        import lzma
+        return lzma.open(file_name, mode, preset=XZ_PRESET if 'w' in mode else None)
+    return open(file_name, mode, buffering=1 << 20)
+
+@contextlib.contextmanager
+def readingMazeText(file_name):
+    '''Context opening the maze text file <file_name> for reading (see openMazeText). A compressed file that
+    turns out to be corrupt or cut short raises ValueError while it's read, like any other invalid maze,
+    instead of whatever the decompressor raised.'''
+    import lzma
+    with openMazeText(file_name) as f:
+        try:
+            yield f
+        except (lzma.LZMAError, EOFError, OSError) as e:
+            raise ValueError(f"{file_name}: Corrupt compressed maze! ({e})") from e
+
+@contextlib.contextmanager
+def replacedAtomically(file_name):
+    '''Context giving the name of a temporary file (next to <file_name>) to write instead of <file_name>. Once
+    the code run inside it finishes, the temporary file is flushed to disk and renamed to <file_name> in one
+    step, so <file_name> is either left as it was or completely written. The temporary file is removed if the code fails.'''
+    temp = f"{file_name}.{os.getpid()}.tmp"
+    try:
+        yield temp
+        fd = os.open(temp, os.O_RDWR)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(temp, file_name)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp)
+        raise
+
+def isSolvableMaze(grid, start, end):
+    '''Checks, without printing anything, that a Grid has exactly 1 start and end (at the coords given)
+    and that the end can be reached from the start.'''
+    return (grid.cells.count(START) == 1 and grid.cells.count(END) == 1 and grid.get(start[0], start[1]) == START
+            and grid.get(end[0], end[1]) == END and canReach(grid, start, end))
+
+def convertMazeFile(src_name, dst_name):
+    '''Converts the maze file <src_name> into <dst_name>, in the formats given by their extensions (any of
+    MAZE_FORMATS), streaming the rows into the new file. Returns the number of rows converted, or raises ValueError.'''
+    formats = (mazeFileFormat(src_name), mazeFileFormat(dst_name))
+    if None in formats:
+        raise ValueError(f"Can't convert {src_name} to {dst_name}, only between {', '.join('.' + fmt for fmt in MAZE_FORMATS)} files!")
+    if formats[0] == "mzb":
+        grid, start, end, verified = readMZBFile(src_name)
+    else:
+        grid, start, end = readMazeFile(src_name)
+        verified = formats[1] == "mzb" and canReach(grid, start, end)
+    try:
+        return writeMazeFile(grid, dst_name, verified)
+    finally:
+        grid.close()
+
+def verifySolvable(maze, start, end):
+        '''Verifies that the end coords can be reached from the start coords within a Grid.'''
+        if canReach(maze, start, end):
+            return True
+        print("Invalid maze! The end point can't be reached from the starting point!")
+        return False
+
+def openLeaderboard(name):
+    '''Opens the leaderboard called <name>, stored as set by globalStorageMode.'''
+    with profiler.stage("leaderboard.load"):
+        if globalStorageMode == 1:
+            l_board = SQLiteLeaderboard(name + ".db")
+            l_board.importFile(name + ".txt") # Only ever imported once
+            return l_board
+        return Leaderboard(name + ".txt")
+
+def getLeaderboard(name):
+    '''Returns the game's leaderboard called <name> ("leaderboard" or "pi_leaderboard"), opening it the first
+    time it's needed, so the command line tools never load leaderboards they don't use.'''
+    if name not in leaderboards:
+        leaderboards[name] = openLeaderboard(name)
+    return leaderboards[name]
+
 def DisplayMainMenu():
     print("\nMAIN MENU" + "\n=========")
     options = {
@@ -564,24 +3400,380 @@ def DisplayMainMenu():
     return choice
 
 def inputFromPi():
-    while True:
-        time.sleep(0.3)
-        direction_map = {"up":"W", "down":"S", "left":"A", "right":"D", "middle":"M"}
-        for event in s.stick.get_events():
-            if event.action == "pressed":
-                if event.direction in direction_map:
-                    return direction_map[event.direction]
-
-def checkPiAvailable(s_available):
+    '''Waits for the next joystick press on the SenseHat and returns it as a key (W/A/S/D, or M for middle).'''
+    reader = getPiInput()
+    if isinstance(s, FakeSenseHat) and s.stick.keyboard and reader.keys.empty():
+        while not s.stick.pressKeys(input("Joystick keys (W/A/S/D, M for middle): ")): # Nothing to wait for until a key is pressed
+            print("No joystick keys pressed!")
+    return reader.get()
+
+def getPiInput():
+    '''Returns the PiInput object reading the SenseHat joystick, starting it on first use.'''
+    global piInput
+    if piInput is None:
+        piInput = PiInput(s.stick)
+    return piInput
+
+def checkPiAvailable():
+    '''Checks if the SenseHat can be used, looking for it the first time it's needed (or using the stand-in,
+    when MAZER_FAKE_SENSEHAT is set), so nothing else waits on the sense_hat module.'''
+    global s, s_available
+    if s_available is None:
+        if os.environ.get("MAZER_FAKE_SENSEHAT"):
+            s, s_available = FakeSenseHat(keyboard=True), True
+        else:
+            try:
+                from sense_hat import SenseHat
+                s = SenseHat()
+                s_available = True
+            except:
+                s_available = False
+
     if s_available:
         return True
     else:
         print("Module <sense_hat> Not Found!")
         return False
         
+# NOTE: COMMAND LINE
+def cliMain(argv):
+    '''Runs the command line tools (see "python3 mazer.py --help") with the arguments in <argv>, printing
+    one JSON object per line for every maze. Returns the exit code: 0 if every maze succeeded, else 1.'''
+    parser = argparse.ArgumentParser(prog="mazer.py", description="Batch tools for < m a z e r >. Run without arguments to play.")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="worker processes to use (default: all cores)")
+    parser.add_argument("--profile", action="store_true",
+                        help="time each stage and print a summary on exit (also set by MAZER_PROFILE)")
+    parser.add_argument("--profile-out", default="-", metavar="FILE",
+                        help="save the --profile summary to FILE as JSON instead (implies --profile)")
+    commands = parser.add_subparsers(dest="command")
+
+    for name, helpText in [("validate", "check that mazes load and can be solved"), ("digest", "print the leaderboard id of mazes"),
+                           ("solve", "find the shortest path through mazes"), ("render", "draw mazes as they are shown in game"),
+                           ("convert", "convert mazes between .csv (or compressed .csv.gz/.csv.xz) and .mzb"),
+                           ("analyze", "count the junctions, dead ends and corridors of mazes")]:
+        command = commands.add_parser(name, help=helpText)
+        command.add_argument("files", nargs="+", help="maze files or glob patterns (e.g. 'mazes/**/*.csv')")
+        if name == "solve":
+            command.add_argument("--method", choices=list(SOLVERS), default="bfs")
+            command.add_argument("--path", action="store_true", help="include the path found")
+        elif name == "render":
+            command.add_argument("--color", action="store_true", help="use terminal color highlighting")
+        elif name == "convert":
+            command.add_argument("--to", choices=MAZE_FORMATS, required=True)
+            command.add_argument("--out-dir", help="directory for converted files (default: next to each file)")
+
+    command = commands.add_parser("edit", help="make the edits in a script to mazes, without asking for anything")
+    command.add_argument("files", nargs="+", help="maze files or glob patterns (e.g. 'mazes/**/*.csv')")
+    command.add_argument("--script", required=True,
+                         help="file of edits, one per line: " + ", ".join(f"{name} {args}".strip() for name, args in SCRIPT_OPERATIONS.items()))
+    command.add_argument("--out-dir", required=True, help="directory for the edited mazes (same names and formats)")
+
+    command = commands.add_parser("audit", help="replay the move logs on a leaderboard against their mazes")
+    command.add_argument("leaderboard", help="leaderboard file (.txt, or .db for SQLite)")
+    command.add_argument("files", nargs="+", help="maze files or glob patterns to find the leaderboard's mazes in")
+
+    command = commands.add_parser("generate", help="generate random mazes")
+    command.add_argument("--rows", type=int, required=True)
+    command.add_argument("--cols", type=int, required=True)
+    command.add_argument("--count", type=int, default=1, help="number of mazes, seeded from --seed upwards")
+    command.add_argument("--seed", type=int, default=0)
+    command.add_argument("--method", choices=list(GENERATORS), default="eller")
+    command.add_argument("--format", choices=MAZE_FORMATS, default="csv")
+    command.add_argument("--out-dir", default=".")
+    command = commands.add_parser("bench", help="time the game's hot paths on synthetic mazes and leaderboards")
+    command.add_argument("--sizes", type=int, nargs="+", default=BENCH_SIZES, help="maze widths/heights to time")
+    command.add_argument("--boards", type=int, nargs="+", default=BENCH_BOARDS, help="leaderboard sizes to time")
+    command.add_argument("--repeat", type=int, default=3, help="runs of each benchmark, keeping the best")
+    command.add_argument("--out", help="save the results as a JSON file, to compare against later")
+    command.add_argument("--compare", help="results file saved with --out to check for regressions against")
+    command.add_argument("--threshold", type=float, default=BENCH_THRESHOLD, help="slowdown that fails a benchmark (0.1 = 10%%)")
+
+    command = commands.add_parser("bots", help="play mazes with bots as fast as they can go, and count the moves per second")
+    command.add_argument("files", nargs="+", help="maze files or glob patterns (e.g. 'mazes/**/*.csv')")
+    command.add_argument("--bot", choices=list(BOTS), default="random")
+    command.add_argument("--runs", type=int, default=1000, help="playthroughs of each maze, split over the worker processes")
+    command.add_argument("--max-moves", type=int, default=10000, help="keys a bot can send in one playthrough before giving up")
+    command.add_argument("--seed", type=int, default=0)
+
+    command = commands.add_parser("serve", help="host mazes for many players at once over the network")
+    command.add_argument("files", nargs="+", help="maze files or glob patterns (e.g. 'mazes/**/*.csv')")
+    command = commands.add_parser("connect", help="play on a game server from this terminal")
+    command = commands.add_parser("loadtest", help="time a game server with many bots playing at once")
+    command.add_argument("--sessions", type=int, default=100, help="bots connected at once")
+    command.add_argument("--moves", type=int, default=100, help="random moves made by each bot")
+    command.add_argument("--seed", type=int, default=0)
+    for name in ["serve", "connect", "loadtest"]:
+        commands.choices[name].add_argument("--host", default=SERVER_HOST)
+        commands.choices[name].add_argument("--port", type=int, default=SERVER_PORT)
+    args = parser.parse_args(argv)
+    if args.profile or args.profile_out != "-":
+        profiler.enable(args.profile_out)
+        args.jobs = 1 # Worker processes can't add to this process's profile
+    if args.command is None:
+        Main() # Play the game, e.g. with --profile
+        return 0
+    if args.command == "audit":
+        return runAudit(args)
+    if args.command == "bench":
+        if min(args.sizes) < 2:
+            parser.error("mazes must be at least 2 by 2")
+        return runBench(args)
+    if args.command == "bots":
+        return runBots(args)
+    if args.command == "serve":
+        return runServe(args)
+    if args.command == "connect":
+        runClient(args.host, args.port)
+        return 0
+    if args.command == "loadtest":
+        import asyncio
+        raiseFileLimit()
+        return int(not printJSONLine(asyncio.run(loadTest(args.host, args.port, args.sessions, args.moves, args.seed))))
+
+    # Each job is one maze, passed to runCliJob as (command, file name or seed, options)
+    options = {k: v for k, v in vars(args).items() if k not in ("command", "files", "jobs")}
+    if args.command == "generate":
+        if args.rows < 2 or args.cols < 2:
+            parser.error("mazes must be at least 2 by 2")
+        os.makedirs(args.out_dir, exist_ok=True)
+        jobs = [(args.command, seed, options) for seed in range(args.seed, args.seed + args.count)]
+    else:
+        if args.command == "edit" or (args.command == "convert" and args.out_dir):
+            os.makedirs(args.out_dir, exist_ok=True)
+        jobs = [(args.command, file_name, options) for file_name in expandMazeFiles(args.files)]
+
+    ok = True
+    for result in mapCliJobs(jobs, args.jobs):
+        ok = printJSONLine(result) and ok
+    return 0 if ok else 1
+
+def mapCliJobs(jobs, workers):
+    '''Runs the command line jobs in <jobs> with runCliJob, fanned out over <workers> processes, and yields
+    their results in order as they come in.'''
+    if workers > 1 and len(jobs) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            yield from pool.map(runCliJob, jobs, chunksize=max(1, min(64, len(jobs) // (workers * 4))))
+    else:
+        for job in jobs:
+            yield runCliJob(job)
+
+def runAudit(args):
+    '''Runs the audit command: finds the maze of every board on a leaderboard among the given maze files,
+    then replays each maze's move logs in one job. Prints one JSON line per leaderboard entry.'''
+    if not os.path.exists(args.leaderboard):
+        return int(not printJSONLine({"file": args.leaderboard, "ok": False, "error": "Leaderboard not found"}))
+    l_board = SQLiteLeaderboard(args.leaderboard) if args.leaderboard.endswith(".db") else Leaderboard(args.leaderboard)
+    entries = {board.digest_id: [[p.playerID, p.score, p.moves] for p in board.players]
+               for board in l_board.getAllBoards() if board.players}
+
+    # Work out which maze file each board belongs to by digesting every maze file
+    jobs = []
+    for result in mapCliJobs([("digest", file_name, {}) for file_name in expandMazeFiles(args.files)], args.jobs):
+        if result["ok"] and result["md5"] in entries:
+            jobs.append(("audit", result["file"], {"entries": entries.pop(result["md5"])}))
+
+    ok = True
+    for digest_id, players in entries.items():
+        for playerID, score, _ in players:
+            ok = printJSONLine({"digest": digest_id, "player": playerID, "score": score, "ok": False, "error": "Maze not found"}) and ok
+    for result in mapCliJobs(jobs, args.jobs):
+        if not result["ok"]:
+            ok = printJSONLine(result) and ok
+        for entry in result.get("entries", []):
+            ok = printJSONLine(dict(entry, file=result["file"], digest=result.get("md5"))) and ok
+    return 0 if ok else 1
+
+def runBench(args):
+    '''Runs the bench command: prints one JSON line per benchmark and size, and saves them to args.out if
+    given. With args.compare, each result is checked against the same benchmark in that saved file and
+    fails if it got more than args.threshold slower.'''
+    baseline = {}
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = {(r["bench"], r["size"]): r["seconds"] for r in json.load(f)["results"]}
+
+    ok, results = True, []
+    runs = [(f"{n}x{n}", benchMaze, n) for n in args.sizes] + [(f"{n} boards", benchLeaderboard, n) for n in args.boards]
+    runs.append(("startup", benchStartup, sys.executable))
+    with tempfile.TemporaryDirectory() as work_dir:
+        for size, bench, n in runs:
+            for name, seconds in bench(n, work_dir, args.repeat):
+                result = {"bench": name, "size": size, "seconds": seconds, "ok": True}
+                old = baseline.get((name, size))
+                if old:
+                    ratio = seconds / old
+                    result.update(baseline=old, ratio=round(ratio, 3), ok=ratio <= 1 + args.threshold)
+                    if not result["ok"]:
+                        result["error"] = f"{ratio:.2f}x slower than baseline"
+                results.append(result)
+                ok = printJSONLine(result) and ok
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(), "results": results}, f, indent=1)
+    return 0 if ok else 1
+
+def runBots(args):
+    '''Runs the bots command: splits the runs on each maze into one job per worker process, then prints one JSON
+    line per maze with its totals, and a last line with the moves per second made across every process.'''
+    options = {"bot": args.bot, "max_moves": args.max_moves, "seed": args.seed}
+    chunks = max(1, min(args.jobs, args.runs))
+    bounds = [args.runs * i // chunks for i in range(chunks + 1)]
+    jobs = [("bots", file_name, dict(options, first=bounds[i], runs=bounds[i + 1] - bounds[i]))
+            for file_name in expandMazeFiles(args.files) for i in range(chunks)]
+
+    # Jobs come back in order, so each maze's jobs are added up as they arrive
+    ok, files, startTime = True, {}, time.perf_counter()
+    for result in mapCliJobs(jobs, args.jobs):
+        total = files.setdefault(result["file"], {"file": result["file"], "ok": True, "runs": 0, "wins": 0, "moves": 0, "keys": 0, "seconds": 0.0})
+        if not result["ok"]:
+            total.update(ok=False, error=result["error"])
+        for key in ["runs", "wins", "moves", "keys", "seconds"]:
+            total[key] += result.get(key, 0)
+    seconds = time.perf_counter() - startTime
+
+    for total in files.values():
+        if total["ok"]:
+            total.update(seconds=round(total["seconds"], 3), moves_per_second=round(total["moves"] / max(total["seconds"], 1e-9)))
+        else:
+            total = {key: total[key] for key in ["file", "ok", "error"]}
+        ok = printJSONLine(total) and ok
+    done = [total for total in files.values() if total["ok"]]
+    moves = sum(total["moves"] for total in done)
+    printJSONLine({"total": True, "ok": ok, "bot": args.bot, "files": len(done), "runs": sum(total["runs"] for total in done),
+                   "wins": sum(total["wins"] for total in done), "moves": moves, "seconds": round(seconds, 3),
+                   "moves_per_second": round(moves / seconds), "runs_per_second": round(sum(total["runs"] for total in done) / seconds)})
+    return 0 if ok else 1
+
+def runServe(args):
+    '''Runs the serve command: loads every maze file into one MazeServer, which records wins to the game's
+    own leaderboard, and serves them until stopped with Ctrl+C. Mazes that fail to load are skipped.'''
+    server = MazeServer(getLeaderboard("leaderboard"))
+    for file_name in expandMazeFiles(args.files):
+        try:
+            server.addMaze(Maze(*openMazeFile(file_name)), file_name)
+        except (OSError, ValueError) as e:
+            printJSONLine({"file": file_name, "ok": False, "error": str(e) or type(e).__name__})
+    if not server.mazes:
+        print("No mazes to serve!")
+        return 1
+    raiseFileLimit()
+    import asyncio
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
+    return 0
+
+def expandMazeFiles(patterns):
+    '''Returns the maze files matched by the file names / glob patterns in <patterns>, in order. Patterns
+    that match nothing are kept as they are, so they are reported as missing files.'''
+    files = []
+    for pattern in patterns:
+        files.extend(sorted(glob.glob(pattern, recursive=True)) or [pattern])
+    return files
+
+def printJSONLine(result):
+    '''Prints the dict <result> as one line of JSON, and returns whether it was successful.'''
+    sys.stdout.write(json.dumps(result) + "\n")
+    sys.stdout.flush()
+    return result["ok"]
+
+def runCliJob(job):
+    '''Runs one command line job (see cliMain) and returns its result as a dict. Runs in worker processes.'''
+    command, target, options = job
+    if command == "generate":
+        return runGenerateJob(target, options)
+
+    result, grid = {"file": target, "ok": False}, None
+    try:
+        if command == "convert":
+            out_dir = options["out_dir"] or os.path.dirname(target)
+            name = os.path.basename(target)
+            stem = name[:-len(mazeFileFormat(name)) - 1] if mazeFileFormat(name) else name
+            output = os.path.join(out_dir, stem + "." + options["to"])
+            result.update(output=output, rows=convertMazeFile(target, output), ok=True)
+            return result
+
+        grid, start, end = openMazeFile(target) # Same loading and validation as loadMaze
+        maze = Maze(grid, start, end)
+        result.update(ok=True, rows=maze.maze.rows, cols=maze.maze.cols)
+        if command == "edit":
+            maze.setMaze(maze.maze.copy(), maze.start, maze.end) # Unpacked, so it can be edited
+            editor = MazeEditor(maze)
+            result["operations"] = editor.runScript(options["script"])
+            start, end = locateCell(maze.maze, START), locateCell(maze.maze, END)
+            if start is None or end is None or editor.field.get(start[0], start[1]) < 0:
+                raise ValueError("Invalid maze! The edited maze needs exactly 1 start and 1 end, joined by a path!")
+            output = os.path.join(options["out_dir"], os.path.basename(target))
+            writeMazeFile(maze.maze, output, True)
+            result.update(output=output, start=start, end=end, length=editor.field.get(start[0], start[1]))
+        elif command == "audit":
+            result.update(md5=maze.getMazeDigest(), entries=[])
+            for playerID, score, moves in options["entries"]:
+                replay = verifyRun(maze, Player(playerID, score, moves))
+                result["entries"].append({"player": playerID, "score": score, "ok": replay.isValid(), "moves": replay.moves,
+                                          "elapsed": replay.elapsed, "error": replay.error})
+        elif command == "bots":
+            result.update(playBots(maze, options["bot"], options["runs"], options["first"], options["max_moves"], options["seed"]))
+        elif command == "validate":
+            result.update(start=maze.start, end=maze.end)
+        elif command == "analyze":
+            if isinstance(maze.maze, TiledGrid):
+                raise ValueError("Maze is too big to analyze!")
+            result.update(mazeCache.derived(maze.getMazeDigest(), "analysis", lambda: analyzeMaze(maze)))
+        elif command == "digest":
+            result.update(md5=maze.getMazeDigest(), fast=maze.getFastDigest())
+        elif command == "solve":
+            if options["path"]:
+                solution = solve(maze, options["method"])
+                result.update(method=solution.method, length=solution.length, expanded=solution.expanded, path=solution.path)
+            else: # Without the path, the length can be kept in the cache
+                result.update(mazeCache.derived(maze.getMazeDigest(), "solve." + options["method"], lambda: solveSummary(maze, options["method"])))
+        elif command == "render":
+            if isinstance(maze.maze, TiledGrid): # The whole text is built in memory
+                raise ValueError("Maze is too big to render!")
+            global globalPrintMode
+            globalPrintMode = 1 if options["color"] else 0
+            result["text"] = "\n".join(maze.renderRows({}))
+    except (OSError, ValueError) as e:
+        result.update(ok=False, error=str(e) or type(e).__name__)
+    finally:
+        if grid is not None: # Workers run many jobs, so the file behind a packed maze mustn't outlive its job
+            grid.close()
+    return result
+
+def analyzeMaze(maze):
+    '''Returns the analysis of the Maze <maze>'s junction graph (see JunctionGraph.analysis) and its shortest path length.'''
+    graph = maze.getJunctionGraph()
+    return dict(graph.analysis(), length=graph.get(maze.start[0], maze.start[1]))
+
+def solveSummary(maze, method):
+    '''Returns the method, length and cells expanded of the solution to the Maze <maze> found by <method>.'''
+    solution = solve(maze, method)
+    return {"method": solution.method, "length": solution.length, "expanded": solution.expanded}
+
+def runGenerateJob(seed, options):
+    '''Generates one maze for the command line from <seed> and writes it to a file, returning the result.'''
+    rows, cols = options["rows"], options["cols"]
+    file_name = os.path.join(options["out_dir"], f"maze_{rows}x{cols}_{seed}.{options['format']}")
+    result = {"file": file_name, "ok": False, "seed": seed, "rows": rows, "cols": cols}
+    try:
+        if options["method"] == "eller":
+            generateMazeToFile(rows, cols, file_name, seed) # Streams rows, so any size fits in memory
+        else:
+            maze = generateMaze(rows, cols, options["method"], seed)
+            writeMazeFile(maze.maze, file_name, verified=True)
+        result["ok"] = True
+    except OSError as e:
+        result["error"] = str(e)
+    return result
+
 # NOTE: MAIN
 def Main():
     # Setup for IDLE color highlighting
+    global color
     if globalPrintMode == 2:
         color = sys.stdout.shell
         
@@ -594,21 +3786,26 @@ def Main():
         elif choice == 4 and currentMaze.isLoaded(): currentMaze.configureMaze()
         elif choice == 5 and currentMaze.isLoaded(): currentMaze.exportMaze()
         elif choice == 6: currentMaze.createNewMaze()
-        elif choice == 7 and currentMaze.isLoaded() and checkPiAvailable(s_available): currentMaze.playMaze(False)
+        elif choice == 7 and currentMaze.isLoaded() and checkPiAvailable(): currentMaze.playMaze(False)
         elif choice == 8 and currentMaze.isLoaded(): currentMaze.displayMazeLeaderboards()
         input("\nPress [ENTER] to continue:")
 
 # NOTE: GLOBAL VARIABLES
+# Stage timings and counters, only recorded with --profile or MAZER_PROFILE set (to 1 for a summary on
+# stderr, or to a file name to save it as JSON)
+profiler = Profiler()
+if os.environ.get("MAZER_PROFILE"):
+    profiler.enable("-" if os.environ["MAZER_PROFILE"] == "1" else os.environ["MAZER_PROFILE"])
+
 currentMaze = Maze([], [0, 0], [0, 0])
-leaderboard, pi_leaderboard = Leaderboard("leaderboard.txt"), Leaderboard("pi_leaderboard.txt")
-
-# Check if sense_hat can be imported
-try:
-    from sense_hat import SenseHat
-    s = SenseHat()
-    s_available = True
-except:
-    s_available = False
-
-# Run Main
-Main()
\ No newline at end of file
+mazeCache = MazeCache(os.environ.get("MAZER_CACHE", CACHE_DIR), CACHE_LIMIT) # Nothing is read until a maze file is opened
+leaderboards = {} # Leaderboards by name, opened by getLeaderboard the first time each is needed
+
+piInput = None # Started by getPiInput the first time the joystick is needed
+s, s_available = None, None # SenseHat, looked for by checkPiAvailable the first time it's needed
+
+# Run Main, or the command line tools when given any arguments
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(cliMain(sys.argv[1:]))
+    Main()
\ No newline at end of file
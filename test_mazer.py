@@ -0,0 +1,108 @@
+import atexit
+import random
+
+import mazer
+
+
+def openLeaderboard(file_name):
+    '''Opens a Leaderboard without saving it on exit, as the test's directory is gone by then.'''
+    l_board = mazer.Leaderboard(str(file_name))
+    atexit.unregister(l_board.compact)
+    return l_board
+
+
+def boardEntries(l_board, digest_id):
+    return [(p.playerID, p.score) for p in l_board.getBoard(digest_id).players]
+
+
+def test_journal_replays_repeated_wins(tmp_path):
+    digest_id = "ab" * 16
+    l_board = openLeaderboard(tmp_path / "lb.txt")
+    for _ in range(3):
+        l_board.recordWin(l_board.getBoard(digest_id), mazer.Player("Anonymous", 5.0))
+    assert boardEntries(openLeaderboard(tmp_path / "lb.txt"), digest_id) == [("Anonymous", 5.0)] * 3
+
+
+def test_journal_skipped_after_crash_between_rewrite_and_truncate(tmp_path):
+    digest_id = "ab" * 16
+    l_board = openLeaderboard(tmp_path / "lb.txt")
+    l_board.recordWin(l_board.getBoard(digest_id), mazer.Player("alice", 5.0))
+    l_board.recordWin(l_board.getBoard(digest_id), mazer.Player("bob", 6.0))
+
+    def crash():
+        raise KeyboardInterrupt
+    l_board.startJournal = crash # The file is replaced, then the process dies before the journal is emptied
+    try:
+        l_board.updateLeaderboard()
+    except KeyboardInterrupt:
+        pass
+
+    assert boardEntries(openLeaderboard(tmp_path / "lb.txt"), digest_id) == [("alice", 5.0), ("bob", 6.0)]
+
+
+def test_damaged_journal_header_is_skipped(tmp_path):
+    (tmp_path / "lb.txt.journal").write_text("@x1\n" + "ab" * 16 + "|alice|5.0|\n")
+    assert boardEntries(openLeaderboard(tmp_path / "lb.txt"), "ab" * 16) == []
+
+
+def test_distance_field_update_matches_full_search():
+    maze = mazer.generateMaze(15, 21, "kruskal", seed=3)
+    grid, rng = maze.maze, random.Random(7)
+    field = mazer.DistanceField(grid, maze.end)
+    for _ in range(300):
+        r, c = rng.randrange(grid.rows), rng.randrange(grid.cols)
+        if [r, c] in (maze.start, maze.end):
+            continue
+        grid.set(r, c, mazer.PASSAGE if grid.get(r, c) == mazer.WALL else mazer.WALL)
+        field.update(r, c)
+        assert list(field.dist) == list(mazer.DistanceField(grid, maze.end).dist), (r, c)
+
+
+def test_tiled_grid_reads_like_grid(tmp_path, monkeypatch):
+    monkeypatch.setattr(mazer, "TILED_CELLS", 100)
+    monkeypatch.setattr(mazer, "TILE_SIZE", 8)
+    monkeypatch.setattr(mazer, "TILE_CACHE", 4)
+    mazer.generateMazeToFile(37, 45, str(tmp_path / "m.csv"), seed=5)
+    mazer.generateMazeToFile(37, 45, str(tmp_path / "m.mzb"), seed=5)
+    grid = mazer.readMazeFile(str(tmp_path / "m.csv"))[0]
+    tiled = mazer.readMZBFile(str(tmp_path / "m.mzb"))[0]
+    try:
+        assert isinstance(tiled, mazer.TiledGrid)
+        rng = random.Random(1)
+        for _ in range(500): # Jumps around, so tiles are read again after being dropped from the cache
+            r, c = rng.randrange(grid.rows), rng.randrange(grid.cols)
+            assert tiled.get(r, c) == grid.get(r, c), (r, c)
+            assert len(tiled.cells.tiles) <= mazer.TILE_CACHE
+        for r in range(grid.rows):
+            assert tiled.row(r) == bytes(grid.row(r))
+            assert tiled.rowSlice(r, 5, 30) == bytes(grid.rowSlice(r, 5, 30))
+    finally:
+        tiled.close()
+
+
+def runMoves(maze, gap):
+    '''Returns the move log of a shortest run of <maze> with <gap> seconds between moves.'''
+    path = mazer.solve(maze, "bfs").path
+    return mazer.encodeMoveLog([[mazer.STEP_KEYS[(r2 - r1, c2 - c1)], gap] for (r1, c1), (r2, c2) in zip(path, path[1:])])
+
+
+def test_verify_run():
+    maze = mazer.generateMaze(11, 11, seed=2)
+    moves = runMoves(maze, 0.05)
+    steps = len(mazer.MOVE_LOG_PATTERN.findall(moves))
+    assert mazer.verifyRun(maze, mazer.Player("alice", steps * 0.05, moves)).isValid()
+    assert not mazer.verifyRun(maze, mazer.Player("alice", steps * 0.05 - 0.5, moves)).isValid() # Claims to be faster than the moves
+    assert not mazer.verifyRun(maze, mazer.Player("alice", 1.0, runMoves(maze, 0.0))).isValid() # Too fast to be played
+    assert not mazer.verifyRun(maze, mazer.Player("alice", 9.0, moves + "D50")).isValid() # Goes on past the end
+    assert not mazer.verifyRun(maze, mazer.Player("alice", 9.0, "")).isValid()
+
+
+def test_pi_input_from_fake_sensehat(monkeypatch):
+    monkeypatch.setattr(mazer, "s", mazer.FakeSenseHat())
+    monkeypatch.setattr(mazer, "s_available", True)
+    monkeypatch.setattr(mazer, "piInput", None)
+    assert mazer.s.stick.pressKeys("dsxM") == 3
+    assert [mazer.inputFromPi() for _ in range(3)] == ["D", "S", "M"]
+    reader = mazer.getPiInput()
+    reader.markRendered()
+    assert len(reader.latencies) == 1 and reader.lastInputTime is None